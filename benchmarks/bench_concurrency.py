@@ -0,0 +1,113 @@
+"""多个进程同时写同一个存储的压力测试
+
+    python benchmarks/bench_concurrency.py --ops 200 --storage journal
+    python benchmarks/bench_concurrency.py --ops 20 --writers 8 --timeout 60   # CI 中的快速检查
+
+对每个并发度 N, 在临时 HOME 下启动 N 个写进程, 每个进程创建 M 个 Job 再逐个
+标记完成 (带版本号的读取-修改-写入)。结束后检查: 对象总数为 N*M、id 不重复、
+全部已完成, 并报告每秒操作数。写进程在 --timeout 秒内没有就绪或结束时被终止并
+记为失败, 不会让测试一直挂起。任一检查失败时退出码为 1, 可直接用作自动化检查。
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 直接以 python benchmarks/bench_concurrency.py 运行时从仓库根目录导入 todo_cli
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from todo_cli.objects import Job, JobManager, retry_on_conflict
+from todo_cli.sqlite_manager import SqliteObjectManager
+from todo_cli.storage import STORAGES
+
+
+def open_manager(home, storage):
+    if storage == 'sqlite':
+        return SqliteObjectManager(Path(home) / 'todo/.jobs.db', Job)
+    path = Path(home) / 'todo/.jobs.json'
+    return JobManager(path, STORAGES[storage](path))
+
+
+def writer(home, storage, worker, ops, barrier, timeout):
+    manager = open_manager(home, storage)
+    barrier.wait(timeout)
+    titles = [f"w{worker}-{i}" for i in range(ops)]
+    for title in titles:
+        manager.add_objects([Job(title=title, assignee=f"w{worker}")])
+    for title in titles:
+        def complete():
+            version = manager.version()
+            obj = manager.find_by_title(title)[0]
+            obj.completed = True
+            manager.update_objects([obj], expected_version=version)
+        retry_on_conflict(complete, attempts=100)
+
+
+def check(home, storage, writers, ops):
+    objects = open_manager(home, storage).load_objects()
+    ids = [obj.id for obj in objects]
+    errors = []
+    if len(objects) != writers * ops:
+        errors.append(f"对象数 {len(objects)} != {writers * ops}")
+    if len(set(ids)) != len(ids) or 0 in ids:
+        errors.append("id 重复或缺失")
+    if not all(obj.completed for obj in objects):
+        errors.append(f"{sum(not obj.completed for obj in objects)} 个对象未完成")
+    return errors
+
+
+def run(storage, writers, ops, timeout):
+    with tempfile.TemporaryDirectory() as home:
+        barrier = multiprocessing.Barrier(writers + 1)
+        processes = [multiprocessing.Process(target=writer, args=(home, storage, i, ops, barrier, timeout))
+                     for i in range(writers)]
+        for p in processes:
+            p.start()
+        errors = []
+        try:
+            barrier.wait(timeout)
+        except threading.BrokenBarrierError:
+            errors.append(f"写进程 {timeout}s 内未全部就绪")
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        for p in processes:
+            p.join(max(0, deadline - time.monotonic()))
+        elapsed = time.perf_counter() - start
+        hung = [p for p in processes if p.is_alive()]
+        for p in hung:
+            p.terminate()
+            p.join()
+        if hung:
+            errors.append(f"{len(hung)} 个写进程 {timeout}s 内未结束")
+        failed = sum(1 for p in processes if p not in hung and p.exitcode)
+        if failed:
+            errors.append(f"{failed} 个写进程异常退出")
+        if not errors:
+            errors = check(home, storage, writers, ops)
+    return elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ops', type=int, default=100, help='每个进程创建并完成的对象数')
+    parser.add_argument('--writers', default='1,2,4,8,16', help='逗号分隔的并发进程数')
+    parser.add_argument('--storage', default='journal', choices=['json', 'journal', 'mmap', 'sqlite'])
+    parser.add_argument('--timeout', type=float, default=300, help='每一轮等待写进程的最长秒数')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'进程数':>6}{'总操作':>10}{'耗时 (s)':>12}{'操作/秒':>12}  结果")
+    for writers in map(int, args.writers.split(',')):
+        elapsed, errors = run(args.storage, writers, args.ops, args.timeout)
+        total = writers * args.ops * 2
+        print(f"{writers:>6}{total:>10}{elapsed:>12.2f}{total / elapsed:>12.0f}  "
+              f"{'; '.join(errors) or 'OK'}")
+        failed = failed or bool(errors)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""对比 todo exec 每次新建连接与复用连接池的单条命令延迟
+
+    python benchmarks/bench_exec.py --commands 200 --concurrency 1,8,32 --delay 0.02
+
+启动本地替身 shell 服务器 (--delay 模拟握手开销), 分别用 exec_once (每条命令新建
+连接, 即守护进程未运行时的 todo exec) 和 SessionPool (守护进程中的连接池) 执行同样
+的命令, 报告单条命令的延迟百分位数和总吞吐量, 并核对输出与退出码。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from shell_server import serve
+from todo_cli.websocket_client import SessionPool, exec_once
+
+
+async def measure(run, commands, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with limit:
+            start = time.perf_counter()
+            stdout, _, status = await run(f"echo {i}; exit {i % 3}")
+            latencies.append(time.perf_counter() - start)
+            if stdout != f"{i}\n".encode() or status != i % 3:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(commands)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latencies)
+    return (statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99)] * 1000,
+            commands / elapsed, errors)
+
+
+async def main(args):
+    async with serve(delay=args.delay) as server:
+        url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        print(f"{'方式':<8}{'并发':>6}{'p50 ms':>10}{'p99 ms':>10}{'命令/秒':>10}  结果")
+        for concurrency in map(int, args.concurrency.split(',')):
+            pool = SessionPool(max_sessions=concurrency)
+            for name, run in [('新建连接', lambda cmd: exec_once(url, cmd)),
+                              ('连接池', lambda cmd: pool.run(url, cmd))]:
+                p50, p99, rate, errors = await measure(run, args.commands, concurrency)
+                print(f"{name:<8}{concurrency:>6}{p50:>10.2f}{p99:>10.2f}{rate:>10.0f}  "
+                      f"{f'{errors} 个结果错误' if errors else 'OK'}")
+            await pool.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--commands', type=int, default=200, help='每种方式执行的命令数')
+    parser.add_argument('--concurrency', default='1,8,32', help='逗号分隔的并发数')
+    parser.add_argument('--delay', type=float, default=0.02, help='模拟的握手开销 (秒)')
+    asyncio.run(main(parser.parse_args()))
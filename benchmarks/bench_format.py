@@ -0,0 +1,62 @@
+"""对比 JSON 与二进制快照格式的文件大小和编解码耗时
+
+    python benchmarks/bench_format.py --rows 1000000
+
+JSON 分别测量原有的带缩进格式 (JsonStorage) 和每行一条记录的格式 (JournalStorage)。
+"""
+import argparse
+import io
+import json
+import time
+
+from todo_cli import codec
+from todo_cli.storage import encode_snapshot, iter_json_array
+
+ASSIGNEES = ['张三', '李四', '王五', '赵六', '']
+PRIORITIES = ['low', 'medium', 'high']
+
+
+def make_records(rows):
+    return [{
+        'title': f"任务{i}",
+        'description': f"完成第{i}项工作的描述" if i % 3 else "",
+        'completed': i % 4 == 0,
+        'id': i + 1,
+        'priority': PRIORITIES[i % len(PRIORITIES)],
+        'assignee': ASSIGNEES[i % len(ASSIGNEES)],
+    } for i in range(rows)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    records = make_records(args.rows)
+    cases = [
+        ('json (indent=4)',
+         lambda: json.dumps(records, ensure_ascii=False, indent=4).encode('utf-8'),
+         lambda data: json.loads(data)),
+        ('json (每行一条)',
+         lambda: encode_snapshot(records, 'json')[0],
+         lambda data: list(iter_json_array(io.StringIO(data.decode('utf-8'))))),
+        ('binary',
+         lambda: encode_snapshot(records, 'binary')[0],
+         lambda data: list(codec.iter_snapshot(io.BytesIO(data[len(codec.MAGIC):])))),
+    ]
+    print(f"{'格式':<18}{'大小 (MB)':>12}{'编码 (s)':>12}{'解码 (s)':>12}")
+    for name, encode, decode in cases:
+        data, encode_time = timed(encode)
+        decoded, decode_time = timed(lambda: decode(data))
+        assert decoded == records
+        print(f"{name:<18}{len(data) / 2 ** 20:>12.1f}{encode_time:>12.2f}{decode_time:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""对比不同内存表示下每个 Job 占用的内存
+
+    python benchmarks/bench_memory.py --rows 1000000
+
+分别测量: 普通 dataclass (带 __dict__) 与 __slots__ dataclass。
+"""
+import argparse
+import gc
+import tracemalloc
+from dataclasses import dataclass
+
+from todo_cli.objects import Job
+
+ASSIGNEES = ['张三', '李四', '王五', '赵六', '']
+PRIORITIES = ['low', 'medium', 'high']
+
+
+@dataclass
+class DictJob:
+    """改造前的 Job 结构, 用作对照"""
+    title: str
+    description: str = ""
+    completed: bool = False
+    id: int = 0
+    priority: str = "medium"
+    assignee: str = ""
+
+
+def make_records(rows):
+    for i in range(rows):
+        yield {
+            'title': f"任务{i}",
+            'description': f"描述{i}" if i % 3 else "",
+            'completed': i % 4 == 0,
+            'id': i + 1,
+            'priority': PRIORITIES[i % len(PRIORITIES)],
+            'assignee': ASSIGNEES[i % len(ASSIGNEES)],
+        }
+
+
+def measure(build, rows):
+    gc.collect()
+    tracemalloc.start()
+    result = build(make_records(rows))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    cases = [
+        ('dataclass (__dict__)', lambda records: [DictJob(**r) for r in records]),
+        ('dataclass (__slots__)', lambda records: [Job(**r) for r in records]),
+    ]
+    baseline = None
+    print(f"{'表示':<24}{'总内存 (MB)':>14}{'字节/行':>10}{'相对':>8}")
+    for name, build in cases:
+        size = measure(build, args.rows)
+        baseline = baseline or size
+        print(f"{name:<24}{size / 2 ** 20:>14.1f}{size / args.rows:>10.0f}{baseline / size:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
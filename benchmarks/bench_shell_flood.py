@@ -0,0 +1,95 @@
+"""大量输出时 todo wss 的流控测试
+
+    python benchmarks/bench_shell_flood.py --seconds 20 --terminal-mbps 5
+
+本地服务器以最快速度通过通道协议发送输出 (可达每分钟数 GB), 客户端在伪终端中运行,
+基准进程按 --terminal-mbps 限速读取伪终端, 模拟渲染跟不上的终端。服务器每秒发送一次
+ping 并记录 pong 的往返时间: 往返时间反映客户端读取消息的滞后程度, 超过客户端的
+ping_timeout (10 秒) 时连接会被断开。分别测试默认的背压模式和 --drop-output 模式。
+"""
+import argparse
+import asyncio
+import os
+import pty
+import subprocess
+import sys
+import time
+
+import websockets
+
+from todo_cli.websocket_client import CHANNEL_PROTOCOL, STDOUT
+
+CHUNK = bytes([STDOUT]) + b'x' * 79 + b'\n' + b'y' * 79 * 400 + b'\n'
+
+
+async def run(seconds, terminal_mbps, drop):
+    loop = asyncio.get_running_loop()
+    stats = {'sent': 0, 'rtt': [], 'closed': None}
+
+    async def flood(websocket):
+        async def pinger():
+            while True:
+                await asyncio.sleep(1)
+                start = time.perf_counter()
+                await (await websocket.ping())
+                stats['rtt'].append(time.perf_counter() - start)
+
+        task = asyncio.create_task(pinger())
+        deadline = time.perf_counter() + seconds
+        try:
+            while time.perf_counter() < deadline:
+                await websocket.send(CHUNK)
+                stats['sent'] += len(CHUNK) - 1
+            await websocket.close()
+            stats['closed'] = '服务器正常关闭'
+        except websockets.exceptions.ConnectionClosed as e:
+            stats['closed'] = f"连接中断: {e}"
+        finally:
+            task.cancel()
+
+    async with websockets.serve(flood, '127.0.0.1', 0, compression=None,
+                                select_subprotocol=lambda connection, protocols: CHANNEL_PROTOCOL) as server:
+        port = server.sockets[0].getsockname()[1]
+        master, slave = pty.openpty()
+        args = [sys.executable, '-m', 'todo_cli.cli', 'wss', f'ws://127.0.0.1:{port}', '--no-compression']
+        proc = subprocess.Popen(args + (['--drop-output'] if drop else []),
+                                stdin=slave, stdout=slave, stderr=slave, close_fds=True)
+        os.close(slave)
+        os.set_blocking(master, False)
+        received = 0
+        interval = 0.01
+        budget = terminal_mbps * 1e6 * interval
+        try:
+            while proc.poll() is None:
+                start, read = time.perf_counter(), 0
+                try:
+                    while read < budget:
+                        read += len(os.read(master, int(budget - read)))
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    break
+                received += read
+                await asyncio.sleep(max(0.0, interval - (time.perf_counter() - start)))
+        finally:
+            os.close(master)
+            await loop.run_in_executor(None, proc.wait)
+
+    rtt = max(stats['rtt'], default=0)
+    print(f"{'丢弃' if drop else '背压':<6}{stats['sent'] / seconds / 1e6:>10.1f}"
+          f"{stats['sent'] / seconds * 60 / 1e9:>10.2f}{received / 1e6:>10.1f}{rtt:>12.2f}  "
+          f"{stats['closed']}, 客户端退出码 {proc.returncode}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=20, help='服务器持续发送的时间')
+    parser.add_argument('--terminal-mbps', type=float, default=5, help='模拟终端的渲染速度 (MB/s)')
+    args = parser.parse_args()
+    print(f"{'模式':<6}{'发送 MB/s':>10}{'GB/分钟':>10}{'终端 MB':>10}{'最大 ping s':>12}  结果")
+    for drop in (False, True):
+        asyncio.run(run(args.seconds, args.terminal_mbps, drop))
+
+
+if __name__ == '__main__':
+    main()
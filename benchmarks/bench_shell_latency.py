@@ -0,0 +1,125 @@
+"""测量 todo wss 的按键延迟、输出延迟和空闲 CPU
+
+    python benchmarks/bench_shell_latency.py --probes 200
+    python benchmarks/bench_shell_latency.py --probes 50 --idle 1 --max-ms 20   # CI 中的快速检查
+
+在本地启动一个回显 WebSocket 服务器, 在伪终端中运行 todo wss 连接它。每隔 --gap 秒
+向终端写入一个按键, 记录:
+  按键 -> 发送: 写入终端到服务器收到 stdin 消息的时间
+  接收 -> 屏幕: 服务器发出 stdout 消息到终端读到输出的时间
+最后保持连接空闲若干秒, 统计客户端进程在此期间消耗的 CPU 时间。给出 --max-ms 时,
+任一方向的 p99 延迟超过该值则退出码为 1, 可直接用作自动化检查。
+"""
+import argparse
+import asyncio
+import json
+import os
+import pty
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import websockets
+
+# 直接以 python benchmarks/bench_shell_latency.py 运行时, 本进程和 todo wss 子进程都从仓库根目录导入 todo_cli
+ROOT = Path(__file__).resolve().parent.parent
+
+KEYS = b'abcdefghijklmnopqrstuvwxyz'
+
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def report(name, values):
+    """输出延迟分布, 返回 p99 (毫秒)"""
+    values = sorted(v * 1000 for v in values)
+    p99 = values[int(len(values) * 0.99)]
+    print(f"{name:<12}{statistics.median(values):>10.3f}{values[int(len(values) * 0.9)]:>10.3f}"
+          f"{p99:>10.3f}{values[-1]:>10.3f}")
+    return p99
+
+
+async def run(probes, idle, gap):
+    loop = asyncio.get_running_loop()
+    received = {}
+    sent = {}
+    connected = asyncio.Event()
+
+    async def echo(websocket):
+        connected.set()
+        async for message in websocket:
+            msg = json.loads(message)
+            if msg.get('operation') != 'stdin':
+                continue
+            now = time.perf_counter()
+            for key in msg['data'].encode():
+                received.setdefault(key, now)
+            sent[msg['data']] = time.perf_counter()
+            await websocket.send(json.dumps({'operation': 'stdout', 'data': msg['data']}))
+
+    async with websockets.serve(echo, '127.0.0.1', 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        master, slave = pty.openpty()
+        proc = subprocess.Popen([sys.executable, '-m', 'todo_cli.cli', 'wss', f'ws://127.0.0.1:{port}'],
+                                stdin=slave, stdout=slave, stderr=slave, close_fds=True, cwd=ROOT)
+        os.close(slave)
+        output = asyncio.Queue()
+        loop.add_reader(master, lambda: output.put_nowait((time.perf_counter(), os.read(master, 65536))))
+        try:
+            await asyncio.wait_for(connected.wait(), 10)
+            await asyncio.sleep(0.5)
+            while not output.empty():
+                output.get_nowait()
+
+            to_send, to_screen = [], []
+            for i in range(probes):
+                key = KEYS[i % len(KEYS)]
+                received.pop(key, None)
+                start = time.perf_counter()
+                os.write(master, bytes([key]))
+                while True:
+                    at, data = await asyncio.wait_for(output.get(), 5)
+                    if key in data:
+                        break
+                to_send.append(received[key] - start)
+                to_screen.append(at - sent[chr(key)])
+                await asyncio.sleep(gap)
+
+            before = cpu_seconds(proc.pid)
+            await asyncio.sleep(idle)
+            idle_cpu = cpu_seconds(proc.pid) - before
+        finally:
+            loop.remove_reader(master)
+            os.write(master, b'\x03')
+            try:
+                await asyncio.wait_for(loop.run_in_executor(None, proc.wait), 5)
+            except asyncio.TimeoutError:
+                proc.kill()
+            os.close(master)
+
+    print(f"{'':<12}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    p99 = max(report('按键->发送', to_send), report('接收->屏幕', to_screen))
+    print(f"空闲 {idle:.0f}s CPU: {idle_cpu:.3f}s ({idle_cpu / idle * 100:.1f}%)")
+    return p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--probes', type=int, default=200, help='测量的按键次数')
+    parser.add_argument('--gap', type=float, default=0.05, help='按键间隔 (秒)')
+    parser.add_argument('--idle', type=float, default=3.0, help='空闲 CPU 的统计时长 (秒)')
+    parser.add_argument('--max-ms', type=float, help='p99 延迟上限 (毫秒), 超过时退出码为 1')
+    args = parser.parse_args()
+    p99 = asyncio.run(run(args.probes, args.idle, args.gap))
+    if args.max_ms is not None and p99 > args.max_ms:
+        print(f"p99 延迟 {p99:.3f} ms 超过上限 {args.max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""测量 todo wss 接收大量输出时的吞吐量 (MB/s)
+
+    python benchmarks/bench_shell_throughput.py --mb 64
+
+在本地启动一个替身服务器, 客户端连接后立即发送指定大小的输出 (模拟 cat 大日志或
+tar 数据流), 统计客户端把全部数据写到 stdout 所用的时间。分别测量 JSON 消息协议与
+二进制通道协议、启用与不启用 permessage-deflate 的组合; 二进制数据只能走通道协议。
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import websockets
+
+from todo_cli.websocket_client import CHANNEL_PROTOCOL, STDOUT
+
+CHUNK = 32 * 1024
+LOG_LINE = b'2024-01-31 12:00:00 INFO  [worker-3] request /api/todos completed in 12ms status=200\n'
+
+
+def make_payload(kind, size):
+    if kind == 'log':
+        return (LOG_LINE * (size // len(LOG_LINE) + 1))[:size]
+    return os.urandom(size)
+
+
+async def measure(payload, protocol, compression):
+    done = asyncio.Event()
+
+    async def serve(websocket):
+        channel = websocket.subprotocol == CHANNEL_PROTOCOL
+        for start in range(0, len(payload), CHUNK):
+            chunk = payload[start:start + CHUNK]
+            if channel:
+                await websocket.send(bytes([STDOUT]) + chunk)
+            else:
+                await websocket.send(json.dumps({'operation': 'stdout', 'data': chunk.decode()}))
+        await done.wait()
+
+    compress = 'deflate' if compression else None
+    async with websockets.serve(serve, '127.0.0.1', 0, compression=compress,
+                                subprotocols=[CHANNEL_PROTOCOL] if protocol == 'channel' else None,
+                                max_size=None) as server:
+        port = server.sockets[0].getsockname()[1]
+        args = [sys.executable, '-m', 'todo_cli.cli', 'wss', f'ws://127.0.0.1:{port}',
+                '--protocol', protocol] + ([] if compression else ['--no-compression'])
+        proc = await asyncio.create_subprocess_exec(*args, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        received, start = 0, None
+        while received < len(payload):
+            data = await proc.stdout.read(1 << 20)
+            if not data:
+                raise RuntimeError("客户端提前退出")
+            start = start or time.perf_counter()
+            received += len(data)
+        elapsed = time.perf_counter() - start
+        done.set()
+        proc.stdin.close()
+        await proc.wait()
+    return len(payload) / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mb', type=int, default=64, help='每次传输的数据量 (MB)')
+    args = parser.parse_args()
+
+    size = args.mb * 1024 * 1024
+    print(f"{'数据':<8}{'协议':<10}{'压缩':<8}{'MB/s':>10}")
+    for kind in ('log', 'random'):
+        payload = make_payload(kind, size)
+        for protocol in ('json', 'channel'):
+            if kind == 'random' and protocol == 'json':
+                continue
+            for compression in (False, True):
+                rate = asyncio.run(measure(payload, protocol, compression))
+                print(f"{kind:<8}{protocol:<10}{'on' if compression else 'off':<8}{rate:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""测量 list --sort / todo due 在大存储上的查询时间
+
+    python benchmarks/bench_sorted.py --rows 1000000 --top 10
+
+在临时目录中生成 --rows 个带截止日期的待办, 分别测量:
+  全量排序: 读取全部对象后按截止日期排序再取前 K 个 (改造前的做法)
+  堆选择:   边读取边用 heapq.nsmallest 选出前 K 个 (有其他过滤条件时的路径)
+  排序索引: 首次查询时建立索引, 之后直接读取索引的前 K 项
+"""
+import argparse
+import heapq
+import tempfile
+import time
+from pathlib import Path
+
+from todo_cli.objects import TodoManager
+from todo_cli.sort_index import NO_DEADLINE, now_key, sort_key
+from todo_cli.storage import JournalStorage
+
+
+def make_records(rows):
+    for i in range(rows):
+        year = 2020 + i * 7919 % 10
+        yield {
+            'title': f"待办{i}",
+            'description': '',
+            'completed': i % 4 == 0,
+            'id': i + 1,
+            'deadline': '' if i % 10 == 0 else f"{year}-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+        }
+
+
+def timed(name, run, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = run()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{name:<16}{elapsed * 1000:>12.2f}  首项 #{result[0].id if result else '-'}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20, help='索引查询的重复次数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = Path(tmp) / '.todos.json'
+        storage = JournalStorage(file_path, 'binary')
+        storage.replace(list(make_records(args.rows)))
+        manager = TodoManager(file_path, storage)
+        key = sort_key('deadline')
+        now = now_key()
+
+        print(f"{args.rows} 个待办, 取最早逾期的 {args.top} 个")
+        print(f"{'方式':<16}{'耗时 ms':>12}")
+        expected = timed('全量排序', lambda: sorted(
+            (obj for obj in manager.iter_objects(completed=False) if key(obj)[0] < now), key=key)[:args.top])
+        heap = timed('堆选择', lambda: heapq.nsmallest(
+            args.top, (obj for obj in manager.iter_objects(completed=False) if key(obj)[0] < now), key=key))
+        timed('建立排序索引', lambda: manager.top('deadline', args.top, completed=False, below=now))
+        indexed = timed('排序索引', lambda: manager.top('deadline', args.top, completed=False, below=now),
+                        args.repeat)
+        timed('全部按截止日期', lambda: manager.top('deadline', args.top, below=NO_DEADLINE), args.repeat)
+        same = [obj.id for obj in expected] == [obj.id for obj in heap] == [obj.id for obj in indexed]
+        print("结果一致" if same else "结果不一致!")
+
+
+if __name__ == '__main__':
+    main()
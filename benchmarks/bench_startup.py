@@ -0,0 +1,68 @@
+"""测量各子命令的冷启动耗时
+
+    python benchmarks/bench_startup.py --runs 10
+
+每个子命令在临时 HOME 下运行若干次, 报告进程总耗时的中位数, 以及
+python -X importtime 统计的模块导入耗时和导入最慢的几个顶层模块。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMANDS = [
+    ['version'],
+    ['help'],
+    ['list', 'todo'],
+    ['list', 'job', '--limit', '20'],
+    ['create', 'todo', 'bench'],
+    ['complete', 'todo', 'bench'],
+    ['delete', 'todo', 'bench'],
+    ['create', '--file', 'examples/tasks.yaml'],
+]
+
+
+def run(args, env, importtime=False):
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-m', 'todo_cli.cli'] + args
+    start = time.perf_counter()
+    result = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    return time.perf_counter() - start, result.stderr
+
+
+def parse_importtime(stderr):
+    """返回 (导入总耗时微秒, [(累计耗时, 模块名)]), 只统计顶层导入"""
+    top = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            top.append((int(cumulative), name.strip()))
+    return sum(us for us, _ in top), sorted(top, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=3, help='每个子命令显示导入最慢的模块数')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, PYTHONPATH=root)
+        os.chdir(root)
+        print(f"{'子命令':<40}{'耗时中位数 (ms)':>16}{'导入 (ms)':>12}  最慢的导入")
+        for command in COMMANDS:
+            times = [run(command, env)[0] for _ in range(args.runs)]
+            import_us, modules = parse_importtime(run(command, env, importtime=True)[1])
+            slowest = ', '.join(f"{name} {us / 1000:.1f}" for us, name in modules[:args.top])
+            print(f"{' '.join(command):<40}{statistics.median(times) * 1000:>16.1f}"
+                  f"{import_us / 1000:>12.1f}  {slowest}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+"""ObjectManager 与命令行子命令的基准测试, 等同于 todo bench
+
+    python benchmarks/bench_suite.py --sizes 1000,10000,100000,1000000 -o results.json
+    python benchmarks/bench_suite.py --sizes 1000,10000 --compare results.json
+
+实现见 todo_cli/bench.py。
+"""
+import sys
+
+from todo_cli.cli import cli
+
+if __name__ == '__main__':
+    cli(['bench'] + sys.argv[1:], prog_name='bench_suite.py')
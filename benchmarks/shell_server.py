@@ -0,0 +1,95 @@
+"""本地替身 shell 服务器, 供 todo wss / todo exec 的测试和基准测试使用
+
+    python benchmarks/shell_server.py --port 8765 [--delay 0.02]
+
+每个 WebSocket 连接启动一个 /bin/sh (不分配终端), 支持 JSON 消息协议和二进制通道协议。
+--delay 在握手前等待指定秒数, 用于模拟远端建立连接 (TLS、鉴权、创建容器会话) 的开销。
+"""
+import argparse
+import asyncio
+import json
+
+import websockets
+
+from todo_cli.websocket_client import CHANNEL_PROTOCOL, STDERR, STDIN, STDOUT
+
+
+async def _pump(stream, websocket, channel, number):
+    while True:
+        data = await stream.read(65536)
+        if not data:
+            return
+        if channel:
+            await websocket.send(bytes([number]) + data)
+        else:
+            await websocket.send(json.dumps({'operation': 'stdout',
+                                             'data': data.decode(errors='replace')}))
+
+
+async def _close_on_exit(proc, pumps, websocket):
+    """shell 退出且输出发送完后关闭连接"""
+    await proc.wait()
+    await asyncio.gather(*pumps, return_exceptions=True)
+    await websocket.close()
+
+
+def select_subprotocol(connection, subprotocols):
+    """客户端提供了通道协议时使用它, 否则使用 JSON 消息协议"""
+    return CHANNEL_PROTOCOL if CHANNEL_PROTOCOL in subprotocols else None
+
+
+async def shell(websocket):
+    channel = websocket.subprotocol == CHANNEL_PROTOCOL
+    proc = await asyncio.create_subprocess_exec('/bin/sh', stdin=asyncio.subprocess.PIPE,
+                                                stdout=asyncio.subprocess.PIPE,
+                                                stderr=asyncio.subprocess.PIPE)
+    pumps = [asyncio.create_task(_pump(proc.stdout, websocket, channel, STDOUT)),
+             asyncio.create_task(_pump(proc.stderr, websocket, channel, STDERR))]
+    closer = asyncio.create_task(_close_on_exit(proc, pumps, websocket))
+    try:
+        async for message in websocket:
+            if channel:
+                if message[0] != STDIN:
+                    continue
+                data = message[1:]
+            else:
+                msg = json.loads(message)
+                if msg.get('operation') != 'stdin':
+                    continue
+                data = msg['data'].replace('\r', '\n').encode()
+            proc.stdin.write(data)
+            await proc.stdin.drain()
+    except (websockets.exceptions.ConnectionClosed, BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+        for task in pumps + [closer]:
+            task.cancel()
+
+
+def serve(host='127.0.0.1', port=0, delay=0.0):
+    """返回 websockets.serve 的上下文管理器; port 为 0 时由系统分配端口"""
+    async def process_request(connection, request):
+        await asyncio.sleep(delay)
+
+    return websockets.serve(shell, host, port, select_subprotocol=select_subprotocol,
+                            process_request=process_request if delay else None)
+
+
+async def main(args):
+    async with serve(args.host, args.port, args.delay) as server:
+        print(f"ws://{args.host}:{server.sockets[0].getsockname()[1]}", flush=True)
+        await asyncio.Future()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help='握手前的等待时间 (秒)')
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
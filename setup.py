@@ -11,7 +11,6 @@ setup(
     url="https://github.com/atorber/todo-cli",
     packages=find_packages(),
     install_requires=[
-        "simple-term-menu",
         "click>=7.0",
         "click-completion>=0.5.2",
         "PyYAML>=6.0",
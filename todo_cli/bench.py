@@ -0,0 +1,235 @@
+"""ObjectManager 与命令行子命令的基准测试
+
+    todo bench --sizes 1000,10000,100000 --repeat 5 -o results.json
+    todo bench --compare old.json
+
+对每个规模在临时 HOME 下生成合成存储, 每次测量都在独立的子进程中执行,
+以便分别统计峰值内存 (wait4 返回的 ru_maxrss) 和写入字节数 (/proc/self/io 中的 wchar,
+输出被丢弃, 不计入)。计时只包含操作本身, 不包含解释器启动 (见 benchmarks/bench_startup.py)。
+"""
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_REPEAT = 5
+YAML_ITEMS = 100
+
+OPERATIONS = ['load_objects', 'save_objects', 'list', 'list --query', 'complete', 'delete',
+              'create --file']
+
+PRIORITIES = ['low', 'medium', 'high']
+ASSIGNEES = ['张三', '李四', '王五', '赵六', '']
+WORDS = ['项目', '开发', '测试', '部署', '文档', '会议', '评审', '设计', 'release', 'bugfix',
+         'review', 'deploy']
+
+
+def make_record(type_: str, i: int, rng: random.Random) -> Dict:
+    record = {
+        'title': f"任务{i}",
+        'description': ' '.join(rng.choice(WORDS) for _ in range(4)),
+        'completed': rng.random() < 0.3,
+    }
+    if type_ == 'todo':
+        record['deadline'] = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    else:
+        record['priority'] = rng.choice(PRIORITIES)
+        record['assignee'] = rng.choice(ASSIGNEES)
+    return record
+
+
+def write_yaml(path: Path, count: int, rng: random.Random):
+    """按 examples/tasks.yaml 的格式生成 todo 与 job 交替的 YAML 文件"""
+    import yaml
+    items = [dict(make_record(type_, i, rng), type=type_, title=f"导入{i}")
+             for i, type_ in zip(range(count), ['todo', 'job'] * count)]
+    for item in items:
+        del item['completed']
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(items, f, allow_unicode=True, sort_keys=False)
+
+
+class _NullStdout(io.TextIOBase):
+    """丢弃输出, 避免把 list 的输出计入写入字节数"""
+
+    def write(self, s):
+        return len(s)
+
+
+def _written_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def worker(op: str, type_: str, arg: str = '', size: int = 0):
+    """在子进程中执行一次操作, 把耗时和写入字节数以 JSON 输出到 stdout"""
+    from .objects import MANAGERS
+    out, sys.stdout = sys.stdout, _NullStdout()
+    manager = MANAGERS[type_]
+    if op == 'generate':
+        rng = random.Random(0)
+        manager.save_objects([manager.create_object(make_record(type_, i, rng)) for i in range(size)])
+        sys.stdout = out
+        return
+
+    objects = manager.load_objects() if op == 'save_objects' else None
+    args = {
+        'list': ['list', type_],
+        'list --query': ['list', type_, '--query', arg],
+        'complete': ['complete', type_, arg],
+        'delete': ['delete', type_, arg],
+        'create --file': ['create', '--file', arg],
+    }.get(op)
+    if args is not None:
+        from .cli import cli
+    written = _written_bytes()
+    start = time.perf_counter()
+    if op == 'load_objects':
+        manager.load_objects()
+    elif op == 'save_objects':
+        manager.save_objects(objects)
+    else:
+        cli.main(args, prog_name='todo', standalone_mode=False)
+    seconds = time.perf_counter() - start
+    if written is not None:
+        written = _written_bytes() - written
+    sys.stdout = out
+    print(json.dumps({'seconds': seconds, 'bytes_written': written}))
+
+
+def run_worker(home: str, storage: str, *args) -> Dict:
+    """启动一个 worker 子进程, 返回其结果和峰值内存 (KB)"""
+    env = dict(os.environ, HOME=home, TODO_STORAGE=storage, TODO_NO_DAEMON='1')
+    proc = subprocess.Popen([sys.executable, '-m', 'todo_cli.bench'] + [str(a) for a in args],
+                            env=env, stdout=subprocess.PIPE)
+    output = proc.stdout.read()
+    proc.stdout.close()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    if proc.returncode:
+        raise RuntimeError(f"基准测试子进程失败: {' '.join(map(str, args))}")
+    result = json.loads(output) if output.strip() else {}
+    result['peak_rss_kb'] = usage.ru_maxrss
+    return result
+
+
+def percentile(values: List[float], p: float) -> float:
+    """最近秩法百分位数"""
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(size: int, op: str, runs: List[Dict]) -> Dict:
+    seconds = [run['seconds'] for run in runs]
+    written = [run['bytes_written'] for run in runs if run['bytes_written'] is not None]
+    return {
+        'size': size,
+        'op': op,
+        'runs': len(runs),
+        'p50_ms': percentile(seconds, 50) * 1000,
+        'p90_ms': percentile(seconds, 90) * 1000,
+        'p99_ms': percentile(seconds, 99) * 1000,
+        'max_ms': max(seconds) * 1000,
+        'peak_rss_kb': max(run['peak_rss_kb'] for run in runs),
+        'bytes_written': max(written) if written else None,
+    }
+
+
+def bench_size(size: int, type_: str, storage: str, repeat: int, yaml_items: int,
+               operations: List[str], echo=print) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as home:
+        start = time.perf_counter()
+        run_worker(home, storage, 'generate', type_, '', size)
+        echo(f"生成 {size} 个 {type_}: {time.perf_counter() - start:.1f}s")
+        rng = random.Random(size)
+        # complete/delete 每次操作不同的对象, 避免命中已修改过的对象
+        targets = iter(rng.sample(range(size), min(size, 2 * repeat)))
+        yaml_file = Path(home) / 'tasks.yaml'
+        write_yaml(yaml_file, yaml_items, rng)
+        for op in operations:
+            runs = []
+            for _ in range(repeat):
+                if op == 'list --query':
+                    arg = rng.choice(WORDS)
+                elif op in ('complete', 'delete'):
+                    arg = f"任务{next(targets)}"
+                elif op == 'create --file':
+                    arg = yaml_file
+                else:
+                    arg = ''
+                runs.append(run_worker(home, storage, op, type_, arg))
+            results.append(summarize(size, op, runs))
+            echo(format_row(results[-1]))
+    return results
+
+
+def format_row(row: Dict, baseline: Optional[Dict] = None) -> str:
+    written = '-' if row['bytes_written'] is None else f"{row['bytes_written'] / 1024:.0f}"
+    line = (f"{row['size']:>9} {row['op']:<14}{row['p50_ms']:>10.1f}{row['p90_ms']:>10.1f}"
+            f"{row['p99_ms']:>10.1f}{row['peak_rss_kb'] / 1024:>10.1f}{written:>12}")
+    if baseline:
+        line += f"{row['p50_ms'] / baseline['p50_ms']:>9.2f}x"
+    return line
+
+
+HEADER = f"{'规模':>8} {'操作':<12}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'RSS MB':>10}{'写入 KB':>10}"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(sizes: List[int], type_: str = 'job', storage: str = 'journal',
+              repeat: int = DEFAULT_REPEAT, yaml_items: int = YAML_ITEMS,
+              operations: List[str] = OPERATIONS, echo=print) -> Dict:
+    echo(HEADER)
+    results = []
+    for size in sizes:
+        results.extend(bench_size(size, type_, storage, repeat, yaml_items, operations, echo))
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'type': type_,
+            'storage': storage,
+            'repeat': repeat,
+            'yaml_items': yaml_items,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: Dict, current: Dict, echo=print):
+    """逐项对比两次结果的 p50, 最后一列为 当前/基线"""
+    echo(f"基线 {baseline['meta'].get('commit')} -> 当前 {current['meta'].get('commit')}")
+    echo(HEADER + f"{'对比':>8}")
+    previous = {(row['size'], row['op']): row for row in baseline['results']}
+    for row in current['results']:
+        echo(format_row(row, previous.get((row['size'], row['op']))))
+
+
+if __name__ == '__main__':
+    worker(*sys.argv[1:3], *sys.argv[3:4], *map(int, sys.argv[4:5]))
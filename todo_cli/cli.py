@@ -1,87 +1,84 @@
+# 最先导入, --profile 的 import 阶段从这里开始计时
+from .profiling import PROFILER
 import json
-from pathlib import Path
+from functools import lru_cache
 import os
 import click
-import click_completion
-import yaml
-from simple_term_menu import TerminalMenu # type: ignore
-import importlib.metadata
-import asyncio
-from .websocket_client import WebSocketShell
-from .objects import MANAGERS, Todo, Job
-
-try:
-    VERSION = importlib.metadata.version('todo-cli')
-except importlib.metadata.PackageNotFoundError:
-    VERSION = 'unknown'
-
-# 初始化自动补全
-click_completion.init()
+from . import client
+from .objects import MANAGERS, OBJECT_TYPES, Todo, Job, retry_on_conflict
+from .output import FORMATS
+from .storage import StorageError
+
+# 较重的依赖 (yaml、asyncio、websockets、菜单、click_completion、
+# importlib.metadata) 只在用到它们的子命令中导入, 以缩短每次调用的启动时间。
+
+@lru_cache(maxsize=None)
+def get_version():
+    import importlib.metadata
+    try:
+        return importlib.metadata.version('todo-cli')
+    except importlib.metadata.PackageNotFoundError:
+        return 'unknown'
 
 # 添加环境变量用于启用 shell 补全
 os.environ['_TODO_CLI_COMPLETE'] = 'complete_bash'
 
-# 确保 ToDo 文件与安装包目录隔离，如果不存在则创建
-TODO_FILE = Path.home() / "todo/.todo_cli_todos.json"
-# print(TODO_FILE)
-if not TODO_FILE.parent.exists():
-    TODO_FILE.parent.mkdir()
-    print("创建文件")
-    with open(TODO_FILE, "w") as f:
-        json.dump([], f)
-
-def load_todos(file_path):
-    """加载ToDo列表文件."""
-    if not file_path.exists():
-        return []
+def daemon_request(op, **params):
+    """守护进程运行时通过它执行请求, 否则返回 None 由调用方直接读写文件"""
+    if os.environ.get('TODO_NO_DAEMON'):
+        return None
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
-
-def save_todos(todos, file_path):
-    """保存ToDo列表到文件."""
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(todos, f, ensure_ascii=False, indent=4)
+        return client.request(op, **params)
+    except client.DaemonError as e:
+        raise click.ClickException(f"守护进程出错: {e}")
 
 @click.group(invoke_without_command=True)
 @click.option('--menu', is_flag=True, help='启动交互式菜单模式')
+@click.option('--menu-type', type=click.Choice(['todo', 'job']), default='todo', help='菜单模式首先显示的类型')
+@click.option('--profile', is_flag=True, envvar='TODO_PROFILE',
+              help='在标准错误输出各阶段的耗时、读写字节数和对象数 (环境变量 TODO_PROFILE)')
+@click.option('--profile-output', type=click.Path(dir_okay=False), envvar='TODO_PROFILE_OUTPUT',
+              help='把 cProfile 统计保存到文件, 可用 python -m pstats 查看 (环境变量 TODO_PROFILE_OUTPUT)')
+@click.option('--metrics-log', type=click.Path(dir_okay=False), envvar='TODO_METRICS_LOG',
+              help='把各阶段统计以一行 JSON 追加到文件 (环境变量 TODO_METRICS_LOG)')
 @click.pass_context
-def cli(ctx, menu):
+def cli(ctx, menu, menu_type, profile, profile_output, metrics_log):
     """任务管理工具"""
+    if profile or profile_output or metrics_log:
+        import sys
+        PROFILER.start(ctx.invoked_subcommand or ('menu' if menu else None), sys.argv[1:],
+                       cprofile=bool(profile_output))
+        ctx.call_on_close(lambda: PROFILER.finish(profile, profile_output, metrics_log))
     if menu:
-        main_menu()
+        import sys
+        if not sys.stdin.isatty():
+            raise click.ClickException("菜单模式需要在终端中运行")
+        from .menu import run_menu
+        run_menu(menu_type)
     elif ctx.invoked_subcommand is None:
         ctx.invoke(help)
 
 def create_from_yaml(file_path):
-    """从YAML文件创建对象"""
+    """从YAML文件批量创建对象"""
+    import yaml
+    from .importer import import_items, iter_yaml_items
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-            print(data)
-            for item in data:
-                type_ = item.pop('type', 'todo')
-                if type_ not in MANAGERS:
-                    click.echo(f"未知对象类型: {type_}")
-                    continue
-                
-                manager = MANAGERS[type_]
-                if type_ == 'todo':
-                    obj = Todo(**item)
-                else:
-                    obj = Job(**item)
-                
-                objects = manager.load_objects()
-                objects.append(obj)
-                manager.save_objects(objects)
-                click.echo(f"{type_} '{item.get('title')}' 已创建")
-            
-    except Exception as e:
+            report = import_items(iter_yaml_items(f), MANAGERS)
+    except (OSError, yaml.YAMLError, ValueError, TypeError) as e:
+        # PyYAML 构造值时抛出的 ValueError (如不存在的日期 2024-13-45) 同样视为文件无法读取
         click.echo(f"读取YAML文件失败: {str(e)}")
         return
 
+    for index, error in report.errors:
+        click.echo(f"第 {index} 项导入失败: {error}" if index else error)
+    for type_, count in report.created.items():
+        click.echo(f"{type_}: 已创建 {count} 条")
+    created = sum(report.created.values())
+    rate = created / report.elapsed if report.elapsed else 0
+    click.echo(f"共 {report.total} 项, 成功 {created} 项, 失败 {report.total - created} 项, "
+               f"耗时 {report.elapsed:.2f}s ({rate:.0f} 项/秒)")
+
 @cli.command()
 @click.argument('type', type=click.Choice(['todo', 'job']), required=False)
 @click.argument('title', required=False)
@@ -100,77 +97,395 @@ def create(type, title, description, deadline, priority, assignee, file):
         click.echo("创建单个对象需要指定 TYPE 和 TITLE，或使用 --file 选项从 YAML 文件创建。")
         return
         
-    manager = MANAGERS[type]
     if type == 'todo':
         obj = Todo(title=title, description=description, deadline=deadline)
     else:
         obj = Job(title=title, description=description, priority=priority, assignee=assignee)
-    objects = manager.load_objects()
-    objects.append(obj)
-    manager.save_objects(objects)
+    if daemon_request('create', type=type, data=obj.to_dict()) is None:
+        MANAGERS[type].add_objects([obj])
     click.echo(f"{type} '{title}' 已创建")
 
 @cli.command()
 @click.argument('type', type=click.Choice(['todo', 'job']))
 @click.option('--query', '-q', help='搜索关键词')
-def list(type, query):
+@click.option('--status', type=click.Choice(['open', 'done']), help='按完成状态过滤')
+@click.option('--priority', '-p', type=click.Choice(['low', 'medium', 'high']), help='按优先级过滤 (仅job)')
+@click.option('--assignee', '-a', help='按负责人过滤 (仅job)')
+@click.option('--limit', '-n', type=click.IntRange(min=0), help='最多显示的数量')
+@click.option('--offset', type=click.IntRange(min=0), default=0, help='跳过前面的数量')
+@click.option('--sort', type=click.Choice(['deadline', 'priority']),
+              help='按截止日期 (仅todo) 或优先级 (仅job) 排序, 默认按存储顺序')
+@click.option('--top', '-k', type=click.IntRange(min=0), help='排序后只取前 K 个')
+@click.option('--format', '-F', 'fmt', type=click.Choice(FORMATS),
+              default='text', show_default=True, help='输出格式, jsonl/csv/tsv 供脚本读取')
+@click.option('--fields', help='逗号分隔的输出字段 (table/jsonl/csv/tsv), 如 id,title,assignee')
+def list(type, query, status, priority, assignee, limit, offset, sort, top, fmt, fields):
     """列出所有对象或搜索指定对象"""
-    manager = MANAGERS[type]
-    objects = manager.load_objects()
-    if query:
-        objects = [obj for obj in objects if query.lower() in obj.title.lower() 
-                  or query.lower() in obj.description.lower()]
-    
-    if not objects:
+    from .output import open_output, resolve_fields, write_objects
+    if fields and fmt == 'text':
+        raise click.UsageError("--fields 只能用于 table/jsonl/csv/tsv 格式")
+    try:
+        names = resolve_fields(OBJECT_TYPES[type][0], fmt, fields)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    filters = {'completed': None if status is None else status == 'done',
+               'priority': priority, 'assignee': assignee}
+    if sort or top is not None:
+        objects = list_sorted(type, sort, top, query, offset, limit, filters)
+    else:
+        response = daemon_request('list', type=type, query=query, offset=offset, limit=limit,
+                                  filters=filters)
+        if response is not None:
+            object_cls = OBJECT_TYPES[type][0]
+            objects = (object_cls(**data) for data in response['objects'])
+        else:
+            objects = MANAGERS[type].iter_objects(query, offset=offset, limit=limit, **filters)
+
+    with open_output() as out:
+        count = write_objects(out, type, objects, fmt, names)
+    if not count and fmt == 'text':
         click.echo("没有找到对象")
-        return
 
+def list_sorted(type, sort, top, query, offset, limit, filters, below=None):
+    """排序后的前 top 个对象再按 offset/limit 截取; 只需要前几个时用堆选出, 不排序整个存储"""
+    from .sort_index import sort_fields
+    if sort is None:
+        raise click.UsageError("--top 需要和 --sort 一起使用")
+    if sort not in sort_fields(OBJECT_TYPES[type][0]):
+        raise click.UsageError(f"{type} 没有 {sort} 字段, 不能按它排序")
+    k = offset + limit if limit is not None else None
+    if top is not None:
+        k = top if k is None else min(k, top)
+    response = daemon_request('list', type=type, query=query, filters=filters, sort=sort, top=k,
+                              below=below)
+    if response is not None:
+        object_cls = OBJECT_TYPES[type][0]
+        objects = [object_cls(**data) for data in response['objects']]
+    else:
+        objects = MANAGERS[type].top(sort, k, query, below, **filters)
+    return objects[offset:k]
+
+@cli.command()
+@click.option('--overdue', is_flag=True, help='只显示已经逾期的')
+@click.option('--within', type=click.IntRange(min=0), help='只显示 N 天内到期的 (含已逾期)')
+@click.option('--top', '-k', type=click.IntRange(min=0), default=10, show_default=True, help='最多显示的数量')
+@click.option('--all', 'all_', is_flag=True, help='包括已完成的')
+def due(overdue, within, top, all_):
+    """按截止日期列出最早到期的待办"""
+    import datetime
+    from .output import format_text
+    from .sort_index import NO_DEADLINE, deadline_key, now_key
+    now = now_key()
+    below = NO_DEADLINE
+    if overdue:
+        below = now
+    elif within is not None:
+        end = datetime.datetime.now() + datetime.timedelta(days=within)
+        below = int(end.strftime('%Y%m%d%H%M')) + 1
+    filters = {'completed': None if all_ else False}
+    objects = list_sorted('todo', 'deadline', top, None, 0, None, filters, below)
     for obj in objects:
-        status = "[完成]" if obj.completed else "[待办]"
-        click.echo(f"{status} {obj.title}")
-        if obj.description:
-            click.echo(f"  描述: {obj.description}")
-        if type == 'todo' and hasattr(obj, 'deadline') and obj.deadline:
-            click.echo(f"  截止日期: {obj.deadline}")
-        elif type == 'job':
-            click.echo(f"  优先级: {obj.priority}")
-            if obj.assignee:
-                click.echo(f"  负责人: {obj.assignee}")
-        click.echo("---")
+        label = "[完成]" if obj.completed else ("[逾期]" if deadline_key(obj.deadline) < now else "[待办]")
+        click.echo(format_text('todo', obj, label), nl=False)
+    if not objects:
+        click.echo("没有即将到期的待办")
 
 @cli.command()
-@click.argument('type', type=click.Choice(['todo', 'job']))
-@click.argument('title')
-def delete(type, title):
-    """删除指定对象"""
-    manager = MANAGERS[type]
-    objects = manager.load_objects()
-    original_length = len(objects)
-    objects = [obj for obj in objects if obj.title != title]
-    if len(objects) == original_length:
-        click.echo(f"未找到 {type} '{title}'")
-    else:
-        manager.save_objects(objects)
-        click.echo(f"{type} '{title}' 已删除")
+@click.argument('type', type=click.Choice(['todo', 'job']), required=False)
+@click.option('--rebuild', is_flag=True, help='从存储重新计算统计')
+@click.option('--check', is_flag=True, help='对照存储核对统计摘要, 不一致时退出码为 1')
+@click.option('--json', 'as_json', is_flag=True, help='以 JSON 输出, 便于脚本读取')
+def stats(type, rebuild, check, as_json):
+    """数量统计 (只读取统计摘要, 不加载存储)"""
+    import sys
+    from dataclasses import fields
+    from .stats import breakdown, overdue
+    types = [type] if type else [*OBJECT_TYPES]
+    if check:
+        consistent = True
+        for type_ in types:
+            diff = MANAGERS[type_].check_stats()
+            if diff is None:
+                click.echo(f"{type_}: 统计摘要未建立, 已从存储建立")
+                continue
+            for key, (recorded, actual) in diff.items():
+                click.echo(f"{type_} {key}: 摘要 {recorded}, 实际 {actual}")
+            click.echo(f"{type_}: {'统计不一致, 可用 --rebuild 重建' if diff else '统计一致'}")
+            consistent = consistent and not diff
+        sys.exit(0 if consistent else 1)
+
+    result = {}
+    for type_ in types:
+        manager = MANAGERS[type_]
+        counts = manager.rebuild_stats() if rebuild else manager.stats()
+        entry = {'total': counts['total'], 'open': counts['open'], 'done': counts['done']}
+        names = {f.name for f in fields(OBJECT_TYPES[type_][0])}
+        if 'deadline' in names:
+            entry['overdue'] = overdue(counts)
+        for field in ('priority', 'assignee'):
+            if field in names:
+                entry[field] = breakdown(counts, field)
+        result[type_] = entry
+    if as_json:
+        click.echo(json.dumps(result, ensure_ascii=False))
+        return
+    for type_, entry in result.items():
+        line = f"[{type_}] 共 {entry['total']}  待办 {entry['open']}  完成 {entry['done']}"
+        click.echo(line + (f"  逾期 {entry['overdue']}" if 'overdue' in entry else ''))
+        for field, label in (('priority', '优先级'), ('assignee', '负责人')):
+            for value, count in sorted(entry.get(field, {}).items()):
+                click.echo(f"  {label} {value or '(无)'}: 待办 {count['open']}  完成 {count['done']}")
+
+def parse_where(type, expressions):
+    """把 --where 的 key=value 解析为过滤条件, 按字段类型转换取值"""
+    from dataclasses import fields
+    field_types = {f.name: f.type for f in fields(OBJECT_TYPES[type][0])}
+    filters = {}
+    for expression in expressions:
+        key, sep, value = expression.partition('=')
+        key = key.strip()
+        if not sep or key not in field_types:
+            raise click.BadParameter(
+                f"'{expression}' 应为 字段=值, 字段可选: {', '.join(field_types)}", param_hint='--where')
+        if field_types[key] is bool:
+            if value.lower() not in ('true', 'false', '1', '0', 'yes', 'no'):
+                raise click.BadParameter(f"{key} 的取值应为 true 或 false", param_hint='--where')
+            value = value.lower() in ('true', '1', 'yes')
+        elif field_types[key] is int:
+            try:
+                value = int(value)
+            except ValueError:
+                raise click.BadParameter(f"{key} 的取值应为整数", param_hint='--where')
+        filters[key] = value
+    return filters
+
+def read_targets(targets, from_file):
+    """合并命令行参数和文件中的对象引用; 参数 - 表示从标准输入读取, 每行一个"""
+    result = []
+    for target in targets:
+        if target == '-':
+            from_file = from_file or click.open_file('-')
+        else:
+            result.append(target)
+    if from_file is not None:
+        result.extend(line.strip() for line in from_file if line.strip())
+    return result
+
+def target_options(command):
+    """complete/delete 共用的对象选择参数"""
+    decorators = [
+        click.argument('type', type=click.Choice(['todo', 'job'])),
+        click.argument('targets', nargs=-1),
+        click.option('--from-file', '-f', type=click.File('r', encoding='utf-8'),
+                     help='从文件读取 id 或标题, 每行一个 (- 表示标准输入)'),
+        click.option('--where', '-w', multiple=True, help='按字段过滤, 如 assignee=张三, 可重复'),
+        click.option('--priority', '-p', type=click.Choice(['low', 'medium', 'high']), help='按优先级过滤 (仅job)'),
+        click.option('--assignee', '-a', help='按负责人过滤 (仅job)'),
+        click.option('--all', 'all_', is_flag=True, help='标题对应多个对象时全部处理'),
+    ]
+    for decorator in reversed(decorators):
+        command = decorator(command)
+    return command
+
+def apply_to_targets(op, type, targets, from_file, where, priority, assignee, all_):
+    """选出对象后一次性写入: 只读取一次存储, 只追加/重写一次
+
+    没有给出 id 或标题时处理满足过滤条件的全部对象; 给出时再用过滤条件筛选。
+    """
+    targets = read_targets(targets, from_file)
+    filters = parse_where(type, where)
+    if priority:
+        filters['priority'] = priority
+    if assignee:
+        filters['assignee'] = assignee
+    if not targets and not filters:
+        raise click.UsageError("请指定对象: id、标题、--from-file 或过滤条件")
+
+    response = daemon_request(op, type=type, targets=targets, filters=filters, all=all_)
+    if response is None:
+        manager = MANAGERS[type]
+
+        def apply():
+            # 先取版本号再查找, 期间对象被其他进程修改时重新查找
+            version = manager.version()
+            selection = manager.select(targets, all_, **filters)
+            changed = []
+            if not selection.ambiguous:
+                if op == 'complete':
+                    changed = [obj for obj in selection.objects if not obj.completed]
+                    for obj in changed:
+                        obj.completed = True
+                    if changed:
+                        manager.update_objects(changed, expected_version=version)
+                else:
+                    changed = selection.objects
+                    if changed:
+                        manager.delete_objects(changed, expected_version=version)
+            return {'matched': [obj.id for obj in selection.objects], 'changed': len(changed),
+                    'missing': selection.missing, 'ambiguous': selection.ambiguous}
+        response = retry_on_conflict(apply)
+    echo_result(op, type, targets, filters, response)
+
+def echo_result(op, type, targets, filters, response):
+    """输出 complete/delete 的结果; 有标题对应多个对象而未指定 --all 时报错且不做修改"""
+    action = {'complete': '已标记为完成', 'delete': '已删除'}[op]
+    if response['ambiguous']:
+        lines = [f"  '{target}': id {', '.join(map(str, ids))}" for target, ids in response['ambiguous'].items()]
+        raise click.ClickException(
+            "以下标题对应多个对象, 请改用 id 指定, 或加 --all 全部处理:\n" + '\n'.join(lines))
+    missing = response['missing']
+    if missing:
+        shown = ', '.join(f"'{target}'" for target in missing[:10])
+        click.echo(f"未找到 {type} {shown}" + (f" 等 {len(missing)} 个" if len(missing) > 10 else ""))
+    matched = response['matched']
+    if len(targets) == 1 and not filters:
+        if matched:
+            click.echo(f"{type} '{targets[0]}'" + (f" ({len(matched)} 个)" if len(matched) > 1 else "") + f" {action}")
+    elif matched or not missing:
+        click.echo(f"匹配 {len(matched)} 个 {type}, {action} {response['changed']} 个")
 
 @cli.command()
-@click.argument('type', type=click.Choice(['todo', 'job']))
-@click.argument('title')
-def complete(type, title):
-    """将对象标记为完成"""
-    manager = MANAGERS[type]
-    objects = manager.load_objects()
-    for obj in objects:
-        if obj.title == title:
-            obj.completed = True
-            manager.save_objects(objects)
-            click.echo(f"{type} '{title}' 已标记为完成")
+@target_options
+def delete(type, targets, from_file, where, priority, assignee, all_):
+    """删除对象 (TARGETS 为 id 或标题, 可以有多个)"""
+    apply_to_targets('delete', type, targets, from_file, where, priority, assignee, all_)
+
+@cli.command()
+@target_options
+def complete(type, targets, from_file, where, priority, assignee, all_):
+    """将对象标记为完成 (TARGETS 为 id 或标题, 可以有多个)"""
+    apply_to_targets('complete', type, targets, from_file, where, priority, assignee, all_)
+
+@cli.group()
+def daemon():
+    """常驻进程管理 (命令行会自动使用正在运行的守护进程)"""
+
+@daemon.command('start')
+def daemon_start():
+    """在后台启动守护进程"""
+    import subprocess
+    import sys
+    import time
+    if client.request('ping') is not None:
+        click.echo("守护进程已在运行")
+        return
+    subprocess.Popen([sys.executable, '-m', 'todo_cli.daemon'], start_new_session=True,
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(50):
+        response = client.request('ping')
+        if response is not None:
+            click.echo(f"守护进程已启动 (pid {response['pid']})")
             return
-    click.echo(f"未找到 {type} '{title}'")
+        time.sleep(0.1)
+    click.echo("守护进程启动失败")
+
+@daemon.command('run')
+def daemon_run():
+    """在前台运行守护进程"""
+    from .daemon import run
+    run()
+
+@daemon.command('stop')
+def daemon_stop():
+    """停止守护进程, 未落盘的修改会先写入磁盘"""
+    response = client.request('shutdown')
+    click.echo("守护进程已停止" if response is not None else "守护进程未运行")
+
+@daemon.command('status')
+def daemon_status():
+    """查看守护进程状态"""
+    response = client.request('ping')
+    click.echo(f"守护进程运行中 (pid {response['pid']})" if response is not None else "守护进程未运行")
+
+@cli.group()
+def store():
+    """存储管理"""
+
+@store.command('import-sqlite')
+@click.option('--source', type=click.Choice(['journal', 'json']), default='journal', help='源存储引擎')
+def import_sqlite(source):
+    """把现有 JSON 存储一次性导入 SQLite"""
+    from .objects import create_managers
+    from .sqlite_manager import import_json
+    sources = create_managers({'storage': source})
+    targets = create_managers({'storage': 'sqlite'})
+    for type_, manager in sources.items():
+        count = import_json(manager, targets[type_])
+        click.echo(f"{type_}: 已导入 {count} 条到 {targets[type_].file_path}")
+    click.echo('在 ~/todo/config.json 中设置 {"storage": "sqlite"} 以启用 SQLite 存储')
+
+@store.command('convert')
+@click.argument('to', type=click.Choice(['json', 'binary']))
+@click.option('--type', 'types', type=click.Choice(['todo', 'job']), multiple=True, help='只转换指定类型, 默认全部')
+def store_convert(to, types):
+    """在 JSON 与二进制快照格式之间转换, 转换后逐条核对确保无损"""
+    from .storage import MmapStorage, StorageError, detect_format
+    for type_ in types or OBJECT_TYPES:
+        manager = MANAGERS[type_]
+        storage = manager.storage
+        if storage is None:
+            raise click.ClickException("SQLite 存储不支持转换快照格式")
+        if isinstance(storage, MmapStorage) and to != 'binary':
+            # mmap 引擎下次访问时会把 JSON 快照转换回二进制
+            raise click.ClickException("mmap 存储引擎只使用二进制快照, 请先切换到 journal 或 json 引擎再转换")
+        with storage.lock():
+            records = storage.load()
+            before = storage.file_path.stat().st_size if storage.file_path.exists() else 0
+            previous, storage.snapshot_format = storage.snapshot_format, to
+            storage.replace([dict(record) for record in records])
+            if storage.load() != records:
+                storage.snapshot_format = previous or detect_format(storage.file_path)
+                storage.replace(records)
+                raise StorageError(f"{storage.file_path} 转换后的内容与原内容不一致, 已还原")
+        after = storage.file_path.stat().st_size
+        click.echo(f"{type_}: {len(records)} 条, {before / 1024:.1f} KB -> {after / 1024:.1f} KB ({to})")
+    from .objects import load_config
+    configured = load_config().get('format')
+    if configured and configured != to:
+        click.echo(f'配置中的格式为 {configured}, 下次写入快照时会改回; 请在 ~/todo/config.json 中设置 {{"format": "{to}"}}')
+
+@cli.command()
+@click.option('--sizes', default='1000,10000,100000', help='逗号分隔的存储规模 (对象数)')
+@click.option('--type', 'type_', type=click.Choice(['todo', 'job']), default='job', help='测试的对象类型')
+@click.option('--storage', type=click.Choice(['journal', 'json', 'mmap', 'sqlite']), default='journal', help='存储引擎')
+@click.option('--repeat', '-r', type=click.IntRange(min=1), default=5, help='每项操作的重复次数')
+@click.option('--yaml-items', type=click.IntRange(min=1), default=100, help='create --file 导入的条目数')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='把结果保存为 JSON')
+@click.option('--compare', 'baseline', type=click.File('r', encoding='utf-8'), help='与之前保存的 JSON 结果对比')
+def bench(sizes, type_, storage, repeat, yaml_items, output, baseline):
+    """在临时目录中运行基准测试, 报告延迟百分位数、峰值内存和写入字节数"""
+    from .bench import compare, run_suite
+    try:
+        sizes = [int(size) for size in sizes.split(',')]
+    except ValueError:
+        raise click.BadParameter(f"无效的规模: {sizes}", param_hint='--sizes')
+    report = run_suite(sizes, type_, storage, repeat, yaml_items, echo=click.echo)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        click.echo(f"结果已保存到 {output}")
+    if baseline:
+        click.echo()
+        compare(json.load(baseline), report, echo=click.echo)
+
+def shell_options(command):
+    """wss/exec 共用的协议与压缩参数"""
+    decorators = [
+        click.option('--protocol', type=click.Choice(['auto', 'channel', 'json']), default='auto',
+                     help='消息协议: channel 为二进制通道协议, json 为 JSON 消息, auto 优先协商 channel'),
+        click.option('--compression/--no-compression', default=True,
+                     help='是否启用 permessage-deflate 压缩 (默认启用)'),
+        click.option('--drop-output', is_flag=True,
+                     help='交互模式下终端跟不上时丢弃输出并提示丢弃的字节数, 默认暂停接收'),
+    ]
+    for decorator in reversed(decorators):
+        command = decorator(command)
+    return command
 
 @cli.command()
 @click.argument('url', type=str)
-def wss(url):
+@shell_options
+def wss(url, protocol, compression, drop_output):
     """连接到WebSocket Shell"""
     # 移除可能的引号
     url = url.strip('"\'')
@@ -180,7 +495,9 @@ def wss(url):
         return
     
     click.echo(f"正在连接到 {url}...")
-    shell = WebSocketShell(url)
+    import asyncio
+    from .websocket_client import WebSocketShell
+    shell = WebSocketShell(url, protocol=protocol, compression=compression, drop_output=drop_output)
     
     try:
         asyncio.get_event_loop().run_until_complete(shell.connect())
@@ -189,25 +506,152 @@ def wss(url):
     except Exception as e:
         click.echo(f"发生错误: {str(e)}")
 
+async def run_remote(url, command, timeout, protocol, compression):
+    """执行一条非交互命令, 返回 (stdout, stderr, 退出码); 守护进程运行时复用它保持的连接"""
+    if not os.environ.get('TODO_NO_DAEMON'):
+        response = await client.request_async('exec', url=url, command=command, timeout=timeout,
+                                              protocol=protocol, compression=compression)
+        if response is not None:
+            import base64
+            return (base64.b64decode(response['stdout']), base64.b64decode(response['stderr']),
+                    response['status'])
+    from .websocket_client import exec_once
+    return await exec_once(url, command, timeout, protocol, compression)
+
+def read_exec_targets(file):
+    """读取地址文件: 每行一个地址, 或 "名称 地址"; 空行和 # 开头的行被忽略"""
+    targets = []
+    for line in file:
+        fields = line.split()
+        if fields and not fields[0].startswith('#'):
+            targets.append((fields[0] if len(fields) > 1 else None, fields[-1]))
+    return targets
+
+def target_label(url):
+    from urllib.parse import urlsplit
+    parts = urlsplit(url)
+    return parts.netloc + parts.path
+
+def prefix_lines(data, prefix):
+    if not data:
+        return b''
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    return b''.join(prefix + line for line in data.splitlines(keepends=True))
+
+def fan_out(targets, command, timeout, parallel, group, protocol, compression):
+    """在多个地址上并发执行命令, 逐个输出完成的结果, 最后输出汇总; 返回退出码"""
+    import asyncio
+    import sys
+    import time
+    from .websocket_client import run_many
+    labels = {url: name or target_label(url) for name, url in targets}
+    counts = {'ok': 0, 'failed': 0, 'error': 0}
+    failures = []
+    exit_code = 0
+
+    def show(result):
+        nonlocal exit_code
+        label = labels[result.url]
+        if group:
+            state = f"退出码 {result.status}" if result.error is None else f"错误: {result.error}"
+            sys.stdout.buffer.write(f"=== {label} ({state}, {result.seconds:.2f}s) ===\n".encode())
+            sys.stdout.buffer.write(result.stdout)
+            sys.stdout.flush()
+            sys.stderr.buffer.write(result.stderr)
+        else:
+            prefix = f"[{label}] ".encode()
+            sys.stdout.buffer.write(prefix_lines(result.stdout, prefix))
+            sys.stdout.flush()
+            sys.stderr.buffer.write(prefix_lines(result.stderr, prefix))
+            if result.error is not None:
+                sys.stderr.buffer.write(prefix + f"错误: {result.error}\n".encode())
+        sys.stderr.flush()
+        if result.error is not None:
+            counts['error'] += 1
+            failures.append(f"{label} ({result.error})")
+            exit_code = 255
+        elif result.status:
+            counts['failed'] += 1
+            failures.append(f"{label} (退出码 {result.status})")
+            exit_code = max(exit_code, min(result.status, 255))
+        else:
+            counts['ok'] += 1
+
+    async def run_all():
+        async for result in run_many(labels, lambda url: run_remote(url, command, timeout, protocol,
+                                                                     compression),
+                                     parallel, timeout):
+            show(result)
+
+    start = time.perf_counter()
+    asyncio.run(run_all())
+    click.echo(f"共 {len(labels)} 个地址: 成功 {counts['ok']}, 失败 {counts['failed']}, "
+               f"出错 {counts['error']}, 耗时 {time.perf_counter() - start:.2f}s", err=True)
+    for failure in failures:
+        click.echo(f"  {failure}", err=True)
+    return exit_code
+
 @cli.command()
-@click.option('--wss', '-w', type=str, help='WebSocket服务器地址')
-def exec(wss):
-    """连接到WebSocket Shell执行操作 (类似 kubectl exec)"""
-    if not wss:
+@click.option('--wss', '-w', type=str, multiple=True, help='WebSocket服务器地址, 可重复')
+@click.option('--targets', '-T', type=click.File('r', encoding='utf-8'),
+              help='从文件读取地址, 每行一个 ("名称 地址" 或 "地址"; - 表示标准输入)')
+@click.option('--timeout', '-t', type=float, help='非交互命令的超时时间 (秒, 每个地址分别计算)')
+@click.option('--parallel', '-P', type=click.IntRange(min=1), default=16, show_default=True,
+              help='多个地址时最多同时执行的个数')
+@click.option('--group', '-g', is_flag=True, help='多个地址时按地址分段输出, 默认每行加 [地址] 前缀')
+@shell_options
+@click.argument('command', nargs=-1)
+def exec(wss, targets, timeout, parallel, group, protocol, compression, drop_output, command):
+    """连接到WebSocket Shell执行操作 (类似 kubectl exec)
+
+    在 -- 之后给出 COMMAND 时以非交互方式执行它, 输出命令的 stdout/stderr 并以其退出码退出。
+    给出多个地址时在所有地址上并发执行同一条命令, 最后输出汇总。
+    """
+    # 移除可能的引号
+    targets = [(None, url.strip('"\'')) for url in wss] + (read_exec_targets(targets) if targets else [])
+    if not targets:
         click.echo("请提供 WebSocket 服务器地址")
         return
 
-    # 移除可能的引号
-    wss = wss.strip('"\'')
-    
-    if not wss.startswith(('ws://', 'wss://')):
-        click.echo("URL必须以 ws:// 或 wss:// 开头")
+    for _, url in targets:
+        if not url.startswith(('ws://', 'wss://')):
+            click.echo(f"URL必须以 ws:// 或 wss:// 开头: {url}")
+            return
+
+    import sys
+    if command:
+        import shlex
+        command = command[0] if len(command) == 1 else shlex.join(command)
+        if len(targets) > 1 or group:
+            sys.exit(fan_out(targets, command, timeout, parallel, group, protocol, compression))
+        import asyncio
+        from websockets.exceptions import WebSocketException
+        try:
+            stdout, stderr, status = asyncio.run(
+                run_remote(targets[0][1], command, timeout, protocol, compression))
+        except asyncio.TimeoutError:
+            raise click.ClickException(f"命令执行超时 ({timeout}s)")
+        except (OSError, WebSocketException) as e:
+            raise click.ClickException(f"连接错误: {e}")
+        except client.DaemonError as e:
+            raise click.ClickException(f"守护进程出错: {e}")
+        sys.stdout.buffer.write(stdout)
+        sys.stdout.flush()
+        sys.stderr.buffer.write(stderr)
+        sys.exit(status)
+
+    if len(targets) > 1:
+        click.echo("交互模式只能连接一个地址")
         return
+    wss = targets[0][1]
     
     click.echo(f"正在连接到 {wss}...")
     click.echo("提示: 输入'exit'或按Ctrl+C退出连接")
     
-    shell = WebSocketShell(wss)
+    import asyncio
+    from .websocket_client import WebSocketShell
+    shell = WebSocketShell(wss, protocol=protocol, compression=compression, drop_output=drop_output)
     try:
         asyncio.get_event_loop().run_until_complete(shell.connect())
     except KeyboardInterrupt:
@@ -218,21 +662,39 @@ def exec(wss):
 @cli.command()
 def version():
     """显示当前版本"""
-    click.echo(f"todo {VERSION}")
+    click.echo(f"todo {get_version()}")
 
 @cli.command()
 def help():
     """显示帮助信息"""
     help_text = f"""
-版本: {VERSION}
+版本: {get_version()}
 
 命令格式:
     todo create TYPE TITLE [flags]
     todo create --file FILE
     todo list TYPE [flags]
-    todo complete TYPE TITLE
-    todo delete TYPE TITLE
-    todo wss URL               连接WebSocket Shell
+    todo list TYPE --format table|jsonl|csv|tsv [--fields F1,F2]
+                               表格或机器可读的输出
+    todo list TYPE --sort deadline|priority [--top K]
+                               按截止日期/优先级排序
+    todo due [--overdue] [--within DAYS] [--top K]
+                               最早到期的待办
+    todo stats [TYPE] [--json] [--rebuild] [--check]
+                               数量统计
+    todo store import-sqlite   把 JSON 存储导入 SQLite
+    todo store convert json|binary [--type TYPE]
+                               在 JSON 与二进制快照格式之间无损转换
+    todo complete TYPE [ID|TITLE ...] [flags]
+    todo delete TYPE [ID|TITLE ...] [flags]
+    todo wss URL [--protocol auto|channel|json] [--no-compression]
+                               连接WebSocket Shell
+    todo exec --wss URL [-- COMMAND]
+                               交互式或非交互地在远程 shell 中执行命令
+    todo exec -w URL1 -w URL2 | -T FILE [-P N] [-g] -- COMMAND
+                               在多个地址上并发执行命令
+    todo daemon start|stop     启动/停止常驻进程
+    todo --profile COMMAND     输出命令各阶段的耗时 (或设置 TODO_PROFILE=1)
 
 对象类型 (TYPE):
     todo        待办事项
@@ -254,11 +716,26 @@ def help():
     # 搜索工作任务
     todo list job -q "项目"
 
+    # 分页查看工作任务
+    todo list job --limit 20 --offset 40
+
+    # 优先级最高的 5 个未完成任务, 最早逾期的 10 个待办
+    todo list job --sort priority --top 5 --status open
+    todo due --overdue --top 10
+
     # 完成待办事项
     todo complete todo "学习Python"
 
     # 删除工作任务
     todo delete job "项目开发"
+
+    # 按 id 完成 (list 输出中 # 后的数字), 标题重复时必须使用 id 或 --all
+    todo complete job 12
+
+    # 批量完成: 多个 id/标题、从文件或标准输入读取、按字段过滤
+    todo complete job 12 13 "项目开发"
+    todo complete job --from-file done.txt
+    todo delete job --where assignee=张三 --priority low
     """
     click.echo(help_text)
 
@@ -286,94 +763,17 @@ def install_completion():
     click.echo('请运行以下命令使其生效：')
     click.echo(f'source {shell_config}')
 
-def display_todo_menu(todos):
-    """显示ToDo列表菜单."""
-    todo_titles = [f"{'[完成]' if todo.get('completed') else ''} {todo['title']}" for todo in todos]
-    todo_titles.append("添加新任务")
-    todo_titles.append("删除任务")
-    todo_titles.append("标记任务完成")
-    todo_titles.append("搜索任务")
-    todo_titles.append("退出")
-    terminal_menu = TerminalMenu(todo_titles, title="请选择一个操作:")
-    return terminal_menu.show()
-
-def display_todo_details(todo):
-    """显示选中ToDo的详情."""
-    print("\n=== ToDo 详情 ===")
-    for key, value in todo.items():
-        print(f"{key}: {value}")
-    input("\n按任意键返回菜单...")
-
-def add_todo(todos):
-    """添加新任务。"""
-    title = input("请输入任务标题: ")
-    description = input("请输入任务描述: ")
-    deadline = input("请输入任务截止日期 (可选): ")
-    todos.append({"title": title, "description": description, "deadline": deadline, "completed": False})
-    print("任务已添加！")
-
-def delete_todo(todos):
-    """删除任务。"""
-    if not todos:
-        print("没有任务可删除！")
-        return
-    todo_titles = [todo["title"] for todo in todos]
-    terminal_menu = TerminalMenu(todo_titles, title="请选择要删除的任务:")
-    menu_entry_index = terminal_menu.show()
-    if menu_entry_index is not None:
-        del todos[menu_entry_index]
-        print("任务已删除！")
-
-def mark_completed(todos):
-    """标记任务完成。"""
-    if not todos:
-        print("没有任务可标记！")
-        return
-    todo_titles = [todo["title"] for todo in todos if not todo.get("completed")]
-    if not todo_titles:
-        print("所有任务都已完成！")
-        return
-    terminal_menu = TerminalMenu(todo_titles, title="请选择要标记完成的任务:")
-    menu_entry_index = terminal_menu.show()
-    if menu_entry_index is not None:
-        for todo in todos:
-            if todo["title"] == todo_titles[menu_entry_index]:
-                todo["completed"] = True
-                print("任务已标记为完成！")
-
-def search_todos(todos):
-    """搜索任务。"""
-    query = input("请输入搜索关键词: ").lower()
-    results = [todo for todo in todos if query in todo["title"].lower() or query in todo["description"].lower()]
-    if results:
-        for index, todo in enumerate(results, start=1):
-            print(f"\n[{index}] {todo['title']}\n描述: {todo['description']}\n截止日期: {todo.get('deadline', '无')}")
-    else:
-        print("未找到匹配的任务！")
-    input("\n按任意键返回菜单...")
-
-def main_menu():
-    """原有的菜单式操作入口"""
-    todos = load_todos(TODO_FILE)
-    while True:
-        menu_choice = display_todo_menu(todos)
-        if menu_choice is None or menu_choice == len(todos) + 4:
-            break
-        elif menu_choice < len(todos):
-            display_todo_details(todos[menu_choice])
-        elif menu_choice == len(todos):
-            add_todo(todos)
-        elif menu_choice == len(todos) + 1:
-            delete_todo(todos)
-        elif menu_choice == len(todos) + 2:
-            mark_completed(todos)
-        elif menu_choice == len(todos) + 3:
-            search_todos(todos)
-        save_todos(todos, TODO_FILE)
-
 def main():
     """程序主入口"""
-    cli()
+    if '_TODO_COMPLETE' in os.environ:
+        # 只有 shell 请求补全时才需要初始化 click_completion
+        import click_completion
+        click_completion.init()
+    try:
+        cli()
+    except StorageError as e:
+        click.echo(f"存储出错: {e}", err=True)
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
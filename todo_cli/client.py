@@ -0,0 +1,68 @@
+"""守护进程客户端
+
+只依赖标准库中的轻量模块, 每次命令行调用都会导入它。
+"""
+import json
+import socket
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, Optional
+
+from .profiling import PROFILER, profiled
+
+SOCKET_PATH = Path.home() / "todo/.todod.sock"
+
+TIMEOUT = 30
+
+
+class DaemonError(Exception):
+    """守护进程返回了错误, 请求可能已部分生效, 调用方不应再直接读写文件重试"""
+
+
+@profiled('daemon')
+def request(op: str, socket_path: Path = SOCKET_PATH, wait: Optional[float] = TIMEOUT,
+            **params) -> Optional[Dict]:
+    """向守护进程发送一个请求并等待应答 (最多 wait 秒, None 为不限); 守护进程未运行时返回 None"""
+    if not socket_path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(wait)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        # 残留的 socket 文件, 守护进程已经退出
+        sock.close()
+        return None
+    with sock:
+        sock.sendall(json.dumps(dict(params, op=op), ensure_ascii=False).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    return _parse_response(line)
+
+
+async def request_async(op: str, socket_path: Path = SOCKET_PATH, **params) -> Optional[Dict]:
+    """request 的 asyncio 版本, 用于在一个事件循环中并发发出多个请求"""
+    import asyncio
+    if not socket_path.exists():
+        return None
+    with PROFILER.phase('daemon') if PROFILER.enabled else nullcontext():
+        try:
+            reader, writer = await asyncio.open_unix_connection(str(socket_path), limit=2 ** 31 - 1)
+        except OSError:
+            return None
+        try:
+            writer.write(json.dumps(dict(params, op=op), ensure_ascii=False).encode('utf-8') + b'\n')
+            await writer.drain()
+            line = await reader.readline()
+        finally:
+            writer.close()
+    return _parse_response(line)
+
+
+def _parse_response(line: bytes) -> Dict:
+    if not line:
+        raise DaemonError("守护进程未返回结果")
+    response = json.loads(line)
+    if 'error' in response:
+        raise DaemonError(response['error'])
+    return response
@@ -0,0 +1,175 @@
+"""快照文件的二进制格式
+
+    todo store convert binary            把现有快照转换为二进制格式
+    todo store convert json --type job   转换回 JSON
+
+文件布局::
+
+    MAGIC | 头部长度 (u32) | 头部 (JSON) | 记录...
+
+头部记录字段列表 (名称和类型) 与字符串表。每条记录为 长度 (u32) + 内容, 内容首字节
+为 PACKED 时其后是按字段类型打包的定长部分 (int 为 q, bool 为 ?, 字符串表中的字符串
+为 I 序号, 其他字符串为 I 字节数), 再接各字符串的 UTF-8 字节; 为 RAW 时其后是该记录
+的 JSON, 用于字段缺失或取值类型与头部不一致的记录, 保证与 JSON 格式互相转换无损。
+"""
+import json
+import struct
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b'TDOB\x01'
+
+PACKED = 0
+RAW = 1
+
+_LENGTH = struct.Struct('<I')
+
+_CODES = {'int': 'q', 'bool': '?', 'sym': 'I', 'str': 'I'}
+_TYPES = {'int': int, 'bool': bool}
+
+# 不同取值的个数不超过记录数的这个比例时, 字符串字段放入字符串表 (如优先级、负责人)
+SYMBOL_RATIO = 0.5
+
+_INT64 = (-2 ** 63, 2 ** 63 - 1)
+
+
+def _kind(value) -> Optional[str]:
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int) and _INT64[0] <= value <= _INT64[1]:
+        return 'int'
+    if isinstance(value, str):
+        return 'str'
+    return None
+
+
+class BinaryCodec:
+    def __init__(self, fields: List[Tuple[str, str]], strings: List[str]):
+        self.fields = fields
+        self.strings = strings
+        self._names = {name for name, _ in fields}
+        self._symbols = {s: i for i, s in enumerate(strings)}
+        self._struct = struct.Struct('<' + ''.join(_CODES[kind] for _, kind in fields))
+
+    @classmethod
+    def for_records(cls, records: List[Dict]) -> 'BinaryCodec':
+        """按首次出现的取值类型推断字段, 重复较多的字符串字段使用字符串表"""
+        kinds: Dict[str, Optional[str]] = {}
+        values: Dict[str, set] = {}
+        for record in records:
+            for key, value in record.items():
+                if key not in kinds:
+                    kinds[key] = _kind(value)
+                    values[key] = set()
+                if kinds[key] == 'str' and isinstance(value, str):
+                    values[key].add(value)
+        fields, strings = [], set()
+        for name, kind in kinds.items():
+            if kind is None:
+                continue
+            if kind == 'str' and len(values[name]) <= SYMBOL_RATIO * len(records):
+                kind = 'sym'
+                strings |= values[name]
+            fields.append((name, kind))
+        return cls(fields, sorted(strings))
+
+    def header(self) -> bytes:
+        data = json.dumps({'fields': self.fields, 'strings': self.strings},
+                          ensure_ascii=False).encode('utf-8')
+        return MAGIC + _LENGTH.pack(len(data)) + data
+
+    @classmethod
+    def read_header(cls, f: BinaryIO) -> 'BinaryCodec':
+        """从紧跟 MAGIC 之后的位置读取头部"""
+        header = json.loads(f.read(_read_length(f)))
+        return cls([tuple(field) for field in header['fields']], header['strings'])
+
+    def encode(self, record: Dict) -> bytes:
+        try:
+            if record.keys() != self._names:
+                raise KeyError
+            values, tail = [], []
+            for name, kind in self.fields:
+                value = record[name]
+                if kind == 'sym':
+                    value = self._symbols[value]
+                elif kind == 'str':
+                    data = value.encode('utf-8')
+                    tail.append(data)
+                    value = len(data)
+                elif type(value) is not _TYPES[kind]:
+                    raise TypeError
+                values.append(value)
+            return bytes([PACKED]) + self._struct.pack(*values) + b''.join(tail)
+        except (KeyError, TypeError, AttributeError, struct.error):
+            # 字段缺失、多出字段或取值类型不符, 整条按 JSON 保存
+            return bytes([RAW]) + json.dumps(record, ensure_ascii=False).encode('utf-8')
+
+    def field_position(self, name: str) -> Optional[int]:
+        """定长字段 (int/bool) 在 PACKED 记录内容中的字节位置, 用于原地修改"""
+        codes = '<'
+        for field_name, kind in self.fields:
+            if field_name == name:
+                return 1 + struct.calcsize(codes) if kind in _TYPES else None
+            codes += _CODES[kind]
+        return None
+
+    def decode(self, body: bytes) -> Dict:
+        if body[0] == RAW:
+            return json.loads(body[1:])
+        pos = 1 + self._struct.size
+        record = {}
+        for (name, kind), value in zip(self.fields, self._struct.unpack_from(body, 1)):
+            if kind == 'str':
+                record[name] = body[pos:pos + value].decode('utf-8')
+                pos += value
+            elif kind == 'sym':
+                record[name] = self.strings[value]
+            else:
+                record[name] = value
+        return record
+
+
+def _read_length(f: BinaryIO) -> int:
+    data = f.read(_LENGTH.size)
+    if len(data) < _LENGTH.size:
+        raise ValueError("二进制快照被截断")
+    return _LENGTH.unpack(data)[0]
+
+
+def encode_snapshot(records: List[Dict]) -> Tuple[bytes, Dict[int, Tuple[int, int]]]:
+    """编码整个快照, 同时返回每条记录内容的 (偏移量, 长度), 供 id 偏移量索引使用"""
+    codec = BinaryCodec.for_records(records)
+    parts = [codec.header()]
+    pos = len(parts[0])
+    offsets = {}
+    for record in records:
+        body = codec.encode(record)
+        parts.append(_LENGTH.pack(len(body)))
+        parts.append(body)
+        pos += _LENGTH.size
+        offsets[record['id']] = (pos, len(body))
+        pos += len(body)
+    return b''.join(parts), offsets
+
+
+def iter_snapshot(f: BinaryIO) -> Iterator[Dict]:
+    """逐条解码紧跟 MAGIC 之后的内容; 文件被截断时抛出 ValueError"""
+    for _, _, record in iter_offsets(f):
+        yield record
+
+
+def iter_offsets(f: BinaryIO) -> Iterator[Tuple[int, int, Dict]]:
+    """与 iter_snapshot 相同, 同时产出每条记录内容的偏移量和长度"""
+    codec = BinaryCodec.read_header(f)
+    while True:
+        data = f.read(_LENGTH.size)
+        if not data:
+            return
+        if len(data) < _LENGTH.size:
+            raise ValueError("二进制快照被截断")
+        length = _LENGTH.unpack(data)[0]
+        pos = f.tell()
+        body = f.read(length)
+        if len(body) < length:
+            raise ValueError("二进制快照被截断")
+        yield pos, length, codec.decode(body)
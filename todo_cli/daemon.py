@@ -0,0 +1,308 @@
+"""常驻进程: 在内存中保持存储状态, 通过 Unix socket 提供 create/list/complete/delete
+
+    todo daemon start
+    todo daemon stop
+
+守护进程运行时命令行会自动通过 socket 访问它, 否则直接读写文件。写操作先在内存中
+生效, 再按 COMMIT_INTERVAL 成批写入磁盘 (group commit), 批次落盘后才应答客户端。
+其他进程直接修改了存储文件时, 下一次请求会重新加载。
+
+守护进程同时作为 todo exec 的连接池: 到远程 shell 的 WebSocket 连接保持打开,
+非交互命令复用已有连接, 不用每次重新握手。
+"""
+import asyncio
+import base64
+import heapq
+import itertools
+import json
+import os
+import signal
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .client import SOCKET_PATH, request
+from .objects import (MANAGERS, BaseObject, ObjectManager, Selection, matches, parse_target,
+                      select_objects)
+from .search import contains_terms, query_terms
+from .sort_index import sort_key
+from .storage import ConflictError
+
+# 写操作攒批的最长等待时间 (秒) 和最大批量
+COMMIT_INTERVAL = 0.05
+MAX_BATCH = 1000
+
+
+def _stat(path: Optional[Path]) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except (AttributeError, FileNotFoundError):
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class HotStore:
+    """常驻内存的单个存储
+
+    对象按 id 保存; 尚未落盘的新对象没有 id, 暂时使用负数作为键。
+    """
+
+    def __init__(self, manager: ObjectManager):
+        self.manager = manager
+        self.objects: Dict[int, BaseObject] = {}
+        self.dirty: Dict[int, BaseObject] = {}
+        self.deleted: Dict[int, BaseObject] = {}
+        self.fingerprint = None
+        self.version = None
+        self._new_keys = itertools.count(-1, -1)
+
+    @property
+    def pending(self) -> int:
+        return len(self.dirty) + len(self.deleted)
+
+    def _fingerprint(self):
+        journal_path = getattr(self.manager.storage, 'journal_path', None)
+        return _stat(self.manager.file_path), _stat(journal_path)
+
+    def refresh(self):
+        """存储文件被其他进程修改过 (或尚未加载) 时重新加载"""
+        if self.fingerprint == self._fingerprint():
+            return
+        self.flush()
+        fingerprint = self._fingerprint()
+        self.version = self.manager.version()
+        self.objects = {obj.id: obj for obj in self.manager.load_objects()}
+        self.fingerprint = fingerprint
+
+    def add(self, obj: BaseObject):
+        key = next(self._new_keys)
+        self.objects[key] = obj
+        self.dirty[key] = obj
+
+    def select(self, targets: List[str], all_: bool = False, **filters) -> Selection:
+        """与 ObjectManager.select 相同; 先让尚未落盘的对象获得 id, 以便按 id 去重和应答"""
+        if any(key < 0 for key in self.dirty):
+            self.flush()
+        if not targets:
+            return Selection(objects=list(self.iter_objects(**filters)))
+        by_title: Dict[str, List[BaseObject]] = {}
+        for id_ in sorted(self.objects):
+            by_title.setdefault(self.objects[id_].title, []).append(self.objects[id_])
+        found = {}
+        for target in targets:
+            id_, title = parse_target(target)
+            if id_ is not None and id_ in self.objects:
+                found[target] = [self.objects[id_]]
+            else:
+                found[target] = by_title.get(title, []) if title is not None else []
+        return select_objects(found, all_, **filters)
+
+    def update(self, key: int):
+        self.dirty[key] = self.objects[key]
+
+    def delete(self, key: int):
+        obj = self.objects.pop(key)
+        self.dirty.pop(key, None)
+        if key > 0:
+            self.deleted[key] = obj
+
+    def iter_objects(self, query: Optional[str] = None, offset: int = 0,
+                     limit: Optional[int] = None, **filters) -> Iterator[BaseObject]:
+        objects = self.objects.values()
+        if query:
+            # 倒排索引只包含已落盘的对象
+            self.flush()
+            index = self.manager.search_index
+            if not index.exists():
+                index.rebuild(self.objects.values())
+            ids = index.search(query)
+            if ids is not None:
+                terms = query_terms(query)
+                # 逐个核对, 读够 offset + limit 个即停止
+                objects = (self.objects[id_] for id_ in ids
+                           if id_ in self.objects and contains_terms(self.objects[id_], terms))
+                query = None
+        matched = (obj for obj in objects if matches(obj, query, **filters))
+        return itertools.islice(matched, offset, None if limit is None else offset + limit)
+
+    def top(self, sort: str, k: Optional[int] = None, query: Optional[str] = None,
+            below: Optional[int] = None, **filters) -> List[BaseObject]:
+        """与 ObjectManager.top 相同; 对象都在内存中, 直接用堆选出前 k 个"""
+        key = sort_key(sort)
+        matched = self.iter_objects(query, **filters)
+        if below is not None:
+            matched = (obj for obj in matched if key(obj)[0] < below)
+        return sorted(matched, key=key) if k is None else heapq.nsmallest(k, matched, key=key)
+
+    def flush(self):
+        """把内存中的修改一次性写入存储
+
+        写入时带上加载时的版本号; 这些对象在此期间被其他进程修改过时抛出 ConflictError,
+        并丢弃内存中的状态 (包括尚未写入的删除), 下一次请求会重新加载, 不会因为本批次的
+        冲突而失败。
+        """
+        try:
+            if self.dirty:
+                items, self.dirty = list(self.dirty.items()), {}
+                self.version = self.manager.update_objects([obj for _, obj in items],
+                                                           expected_version=self.version)
+                for key, obj in items:
+                    if key < 0:
+                        del self.objects[key]
+                        self.objects[obj.id] = obj
+            if self.deleted:
+                objects, self.deleted = list(self.deleted.values()), {}
+                self.version = self.manager.delete_objects(objects, expected_version=self.version)
+        except ConflictError:
+            self.dirty, self.deleted = {}, {}
+            self.fingerprint = None
+            raise
+        self.fingerprint = self._fingerprint()
+
+
+class TodoDaemon:
+    def __init__(self, socket_path: Path = SOCKET_PATH, commit_interval: float = COMMIT_INTERVAL):
+        self.socket_path = socket_path
+        self.commit_interval = commit_interval
+        self.stores: Dict[str, HotStore] = {}
+        # 每个存储一个等待当前批次落盘的 future, 冲突只通知写入了该存储的请求
+        self._commits: Dict[str, asyncio.Future] = {}
+        self._timer = None
+        self._stop = None
+        self._sessions = None
+
+    def store(self, type_: str) -> HotStore:
+        if type_ not in self.stores:
+            self.stores[type_] = HotStore(MANAGERS[type_])
+        store = self.stores[type_]
+        store.refresh()
+        return store
+
+    async def commit(self, type_: str):
+        """等待当前批次落盘; 同一批次内的所有写请求共用一次写入"""
+        loop = asyncio.get_event_loop()
+        if type_ not in self._commits:
+            self._commits[type_] = loop.create_future()
+        if self._timer is None:
+            self._timer = loop.call_later(self.commit_interval, self._flush)
+        future = self._commits[type_]
+        if sum(store.pending for store in self.stores.values()) >= MAX_BATCH:
+            self._timer.cancel()
+            self._flush()
+        await future
+
+    def _flush(self):
+        commits, self._commits, self._timer = self._commits, {}, None
+        for type_, future in commits.items():
+            try:
+                self.stores[type_].flush()
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+    async def dispatch(self, request: Dict) -> Dict:
+        op = request['op']
+        if op in ('ping', 'shutdown'):
+            return {'pid': os.getpid()}
+        if op == 'exec':
+            return await self.exec(request)
+
+        store = self.store(request['type'])
+        if op == 'list':
+            if request.get('sort'):
+                objects = store.top(request['sort'], request.get('top'), request.get('query'),
+                                    request.get('below'), **request.get('filters', {}))
+                offset, limit = request.get('offset', 0), request.get('limit')
+                objects = objects[offset:None if limit is None else offset + limit]
+            else:
+                objects = store.iter_objects(request.get('query'), request.get('offset', 0),
+                                             request.get('limit'), **request.get('filters', {}))
+            return {'objects': [obj.to_dict() for obj in objects]}
+        if op == 'create':
+            store.add(store.manager.create_object(request['data']))
+            await self.commit(request['type'])
+            return {}
+        if op in ('complete', 'delete'):
+            selection = store.select(request.get('targets', []), request.get('all', False),
+                                     **request.get('filters', {}))
+            changed = []
+            if not selection.ambiguous:
+                if op == 'complete':
+                    changed = [obj for obj in selection.objects if not obj.completed]
+                    for obj in changed:
+                        obj.completed = True
+                        store.update(obj.id)
+                else:
+                    changed = selection.objects
+                    for obj in changed:
+                        store.delete(obj.id)
+            if changed:
+                await self.commit(request['type'])
+            return {'matched': [obj.id for obj in selection.objects], 'changed': len(changed),
+                    'missing': selection.missing, 'ambiguous': selection.ambiguous}
+        raise ValueError(f"未知操作: {op}")
+
+    async def exec(self, request: Dict) -> Dict:
+        """通过连接池在远程 shell 中执行命令, 输出以 base64 返回"""
+        if self._sessions is None:
+            from .websocket_client import SessionPool
+            self._sessions = SessionPool()
+        try:
+            stdout, stderr, status = await self._sessions.run(
+                request['url'], request['command'], request.get('timeout'),
+                request.get('protocol', 'auto'), request.get('compression', True))
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"命令执行超时 ({request.get('timeout')}s)")
+        return {'stdout': base64.b64encode(stdout).decode(), 'stderr': base64.b64encode(stderr).decode(),
+                'status': status}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            line = await reader.readline()
+            while line:
+                try:
+                    request = json.loads(line)
+                    response = await self.dispatch(request)
+                except Exception as e:
+                    request, response = {}, {'error': str(e)}
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+                if request.get('op') == 'shutdown':
+                    self._stop.set()
+                    break
+                line = await reader.readline()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self._stop = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self._stop.set)
+        server = await asyncio.start_unix_server(self.handle, path=str(self.socket_path))
+        os.chmod(self.socket_path, 0o600)
+        try:
+            await self._stop.wait()
+        finally:
+            server.close()
+            if self._timer is not None:
+                self._timer.cancel()
+            self._flush()
+            if self._sessions is not None:
+                await self._sessions.close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+
+def run(socket_path: Path = SOCKET_PATH):
+    """在前台运行守护进程"""
+    if request('ping', socket_path) is not None:
+        raise SystemExit("守护进程已在运行")
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if socket_path.exists():
+        socket_path.unlink()
+    asyncio.run(TodoDaemon(socket_path).serve())
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,127 @@
+"""从 YAML 批量导入对象
+
+YAML 按事件流式解析, 顶层为列表的文档逐项产出, 大文件不会整体驻留内存。
+条目先全部校验并按类型分组, 每个管理器只写入一次。不加引号的日期 (YAML 解析为
+date/datetime) 和数字转换为字符串; 类型不对的字段只使该条目被拒绝。
+"""
+import datetime
+import time
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Iterator, List, Tuple
+
+import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.resolver import Resolver
+
+from .objects import PRIORITIES, BaseObject, ObjectManager
+
+if yaml.__with_libyaml__:
+    from yaml.cyaml import CParser
+
+    class StreamLoader(CParser, Composer, SafeConstructor, Resolver):
+        """由 libyaml 产生事件, 逐项组装节点仍由 Python 完成"""
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+else:
+    StreamLoader = yaml.SafeLoader
+
+
+def iter_yaml_items(stream) -> Iterator[Any]:
+    """逐个产出 YAML 条目, 支持以 --- 分隔的多文档"""
+    loader = StreamLoader(stream)
+    try:
+        loader.get_event()  # StreamStartEvent
+        while not loader.check_event(yaml.StreamEndEvent):
+            loader.get_event()  # DocumentStartEvent
+            if loader.check_event(yaml.SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    yield loader.construct_document(loader.compose_node(None, None))
+                loader.get_event()
+            else:
+                yield loader.construct_document(loader.compose_node(None, None))
+            loader.get_event()  # DocumentEndEvent
+            loader.anchors = {}
+    finally:
+        loader.dispose()
+
+
+@dataclass
+class ImportReport:
+    created: Dict[str, int] = field(default_factory=dict)
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    total: int = 0
+    elapsed: float = 0.0
+
+
+def coerce_field(name: str, value: Any, type_: type) -> Any:
+    """把字段值转换为对象字段的类型, 无法转换时抛出 ValueError"""
+    if type_ is bool:
+        if not isinstance(value, bool):
+            raise ValueError(f"{name} 必须是 true 或 false, 实际为 {value!r}")
+        return value
+    if isinstance(value, datetime.datetime):
+        value = value.strftime('%Y-%m-%d %H:%M')
+    elif isinstance(value, datetime.date):
+        value = value.isoformat()
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        raise ValueError(f"{name} 必须是字符串, 实际为 {value!r}")
+    if name == 'priority' and value not in PRIORITIES:
+        raise ValueError(f"priority 必须是 {'/'.join(PRIORITIES)} 之一, 实际为 {value!r}")
+    return value
+
+
+def build_object(item: Any, managers: Dict[str, ObjectManager]) -> Tuple[str, BaseObject]:
+    """校验单个条目并构造对象, 不合法时抛出 ValueError"""
+    if not isinstance(item, dict):
+        raise ValueError(f"条目必须是映射, 实际为 {item!r}")
+    item = dict(item)
+    type_ = item.pop('type', 'todo')
+    if not isinstance(type_, str) or type_ not in managers:
+        raise ValueError(f"未知对象类型: {type_}")
+    # 导入的条目总是新对象, 不能覆盖已有 id
+    item.pop('id', None)
+    types = {f.name: f.type for f in fields(managers[type_].object_cls) if f.name != 'id'}
+    unknown = [key for key in item if key not in types]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(map(str, unknown))}")
+    # 空值 (如只写了 description:) 使用字段的默认值
+    item = {key: coerce_field(key, value, types[key]) for key, value in item.items() if value is not None}
+    if not item.get('title'):
+        raise ValueError("缺少 title")
+    return type_, managers[type_].create_object(item)
+
+
+def import_items(items: Iterator[Any], managers: Dict[str, ObjectManager]) -> ImportReport:
+    """校验全部条目后按类型分组, 每个管理器批量写入一次"""
+    report = ImportReport()
+    start = time.perf_counter()
+    batches: Dict[str, List[BaseObject]] = {}
+    for index, item in enumerate(items, start=1):
+        if item is None:
+            continue
+        report.total += 1
+        try:
+            type_, obj = build_object(item, managers)
+        except (ValueError, TypeError) as e:
+            # 单个条目无法构造时只拒绝该条目
+            report.errors.append((index, str(e)))
+            continue
+        batches.setdefault(type_, []).append(obj)
+
+    for type_, objects in batches.items():
+        try:
+            managers[type_].add_objects(objects)
+        except Exception as e:
+            report.errors.append((0, f"{type_} 批量写入失败: {e}"))
+            continue
+        report.created[type_] = len(objects)
+    report.elapsed = time.perf_counter() - start
+    return report
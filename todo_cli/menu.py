@@ -0,0 +1,308 @@
+"""交互式菜单: 基于 ObjectManager 分页浏览、增量搜索和修改 todo/job
+
+    todo --menu
+
+每次只从存储读取当前一页对象 (iter_objects 的 offset/limit), 搜索时每输入一个字符就
+重新查询并重绘当前页。只有新建、完成、删除才写入存储, 并且只写入改动的对象;
+翻页、搜索和查看详情都不写文件。
+"""
+import os
+import shutil
+import sys
+import termios
+import tty
+from itertools import islice
+from pathlib import Path
+from typing import List, Optional
+
+from .objects import MANAGERS, OBJECT_TYPES, PRIORITIES, BaseObject
+from .output import truncate
+
+# 旧版菜单使用的独立存储, 首次进入菜单时导入到 todo 存储
+LEGACY_FILE = Path.home() / "todo/.todo_cli_todos.json"
+
+# 完成状态过滤的切换顺序
+STATUSES = [(None, '全部'), (False, '待办'), (True, '完成')]
+
+HELP = "↑↓ 移动  ←→ 翻页  / 搜索  Enter 详情  a 新建  c 完成  d 删除  s 状态  t 类型  q 退出"
+
+KEYS = {
+    b'\x1b[A': 'up', b'k': 'up',
+    b'\x1b[B': 'down', b'j': 'down',
+    b'\x1b[D': 'prev', b'\x1b[5~': 'prev',
+    b'\x1b[C': 'next', b'\x1b[6~': 'next', b' ': 'next',
+    b'\r': 'enter', b'\n': 'enter',
+    b'/': 'search', b'a': 'add', b'c': 'complete', b'd': 'delete',
+    b's': 'status', b't': 'type', b'q': 'quit', b'\x03': 'quit', b'\x04': 'quit',
+}
+
+
+def key_length(buf: bytes) -> int:
+    """buf 开头一个按键的字节数: 完整的转义序列或一个 UTF-8 字符; 大于 len(buf) 表示还没有读完整"""
+    if buf[:1] == b'\x1b' and len(buf) > 1:
+        if buf[1:2] == b'[':
+            # CSI 序列以 0x40-0x7e 之间的字节结束
+            for i in range(2, len(buf)):
+                if 0x40 <= buf[i] <= 0x7e:
+                    return i + 1
+            return len(buf) + 1
+        # SS3 序列 (部分终端的方向键) 为三个字节, 其他情况 ESC 单独作为一个按键
+        return 3 if buf[1:2] == b'O' else 1
+    lead = buf[0]
+    return 1 if lead < 0xc0 else 2 if lead < 0xe0 else 3 if lead < 0xf0 else 4
+
+
+def summary(obj: BaseObject) -> str:
+    status = "[完成]" if obj.completed else "[待办]"
+    extra = getattr(obj, 'deadline', '') or ' '.join(
+        filter(None, [getattr(obj, 'priority', ''), getattr(obj, 'assignee', '')]))
+    return f"{status} #{obj.id} {obj.title}" + (f"  ({extra})" if extra else "")
+
+
+def import_legacy(path: Path = LEGACY_FILE) -> int:
+    """把旧版菜单的任务导入 todo 存储, 导入后把旧文件改名, 返回导入的数量"""
+    if not path.exists():
+        return 0
+    import json
+    try:
+        with open(path, encoding='utf-8') as f:
+            items = json.load(f)
+    except json.JSONDecodeError:
+        items = []
+    manager = MANAGERS['todo']
+    objects = [manager.create_object({'title': item.get('title', ''),
+                                      'description': item.get('description', ''),
+                                      'deadline': item.get('deadline', ''),
+                                      'completed': bool(item.get('completed'))})
+               for item in items]
+    if objects:
+        manager.add_objects(objects)
+    path.rename(path.with_name(path.name + '.imported'))
+    return len(objects)
+
+
+class ObjectMenu:
+    def __init__(self, type_: str = 'todo'):
+        self.type = type_
+        self.query = ''
+        self.status = 0
+        self.page = 0
+        self.cursor = 0
+        self.items: List[BaseObject] = []
+        self.has_next = False
+        self.searching = False
+        self.message = ''
+        self._fd = sys.stdin.fileno()
+        self._settings = None
+        # 已读入但尚未处理的输入 (一次读取可能包含多个按键)
+        self._pending = b''
+
+    @property
+    def manager(self):
+        return MANAGERS[self.type]
+
+    @property
+    def page_size(self) -> int:
+        return max(5, shutil.get_terminal_size().lines - 5)
+
+    def load_page(self):
+        """只读取当前页 (多读一个用于判断是否还有下一页)"""
+        size = self.page_size
+        objects = [*islice(self.manager.iter_objects(self.query or None, offset=self.page * size,
+                                                     limit=size + 1,
+                                                     completed=STATUSES[self.status][0]), size + 1)]
+        if not objects and self.page > 0:
+            self.page -= 1
+            return self.load_page()
+        self.has_next = len(objects) > size
+        self.items = objects[:size]
+        self.cursor = min(self.cursor, max(len(self.items) - 1, 0))
+
+    def render(self):
+        """拼好整屏内容后一次写出"""
+        width = shutil.get_terminal_size().columns
+        header = (f"[{self.type}] 第 {self.page + 1} 页  状态: {STATUSES[self.status][1]}"
+                  f"  搜索: {self.query}{'_' if self.searching else ''}")
+        lines = [truncate(header, width), '']
+        for i, obj in enumerate(self.items):
+            lines.append(truncate(f"{'>' if i == self.cursor else ' '} {summary(obj)}", width))
+        if not self.items:
+            lines.append("  没有找到对象")
+        lines += [''] * (self.page_size - len(self.items)) + [truncate(self.message or HELP, width)]
+        os.write(sys.stdout.fileno(), ("\x1b[H\x1b[2J" + "\r\n".join(lines)).encode())
+        self.message = ''
+
+    def read_key(self) -> bytes:
+        """读取一个按键; 快速输入、按键自动重复等一次读到的多个按键排队逐个返回"""
+        if not self._pending:
+            self._pending = os.read(self._fd, 32)
+        size = key_length(self._pending)
+        while size > len(self._pending):
+            # 转义序列或多字节字符被分在了两次读取中
+            more = os.read(self._fd, 32)
+            if not more:
+                break
+            self._pending += more
+            size = key_length(self._pending)
+        key, self._pending = self._pending[:size], self._pending[size:]
+        return key
+
+    def prompt(self, text: str, default: str = '') -> str:
+        """暂时恢复终端的行模式读取一行输入; 此前已读入的按键作为这一行的开头"""
+        label = f"\r\n{text}{f' [{default}]' if default else ''}: "
+        typed = self._pending.decode('utf-8', errors='ignore').replace('\n', '\r')
+        line, newline, rest = typed.partition('\r')
+        self._pending = rest.encode('utf-8')
+        termios.tcsetattr(self._fd, termios.TCSADRAIN, self._settings)
+        try:
+            if newline:
+                os.write(sys.stdout.fileno(), (label + line).encode())
+                value = line
+            else:
+                value = line + input(label + line)
+        finally:
+            tty.setraw(self._fd)
+        value = value.strip()
+        return value or default
+
+    def choose(self, text: str, choices: List[str], default: str) -> str:
+        """从 choices 中选择一项 (输入名称或序号), 输入无效时重新询问"""
+        options = ' '.join(f"{i}.{choice}" for i, choice in enumerate(choices, start=1))
+        while True:
+            value = self.prompt(f"{text} ({options})", default)
+            if value in choices:
+                return value
+            if value.isdigit() and 1 <= int(value) <= len(choices):
+                return choices[int(value) - 1]
+            os.write(sys.stdout.fileno(), f"\r\n无效的选择: {value}".encode())
+
+    @property
+    def selected(self) -> Optional[BaseObject]:
+        return self.items[self.cursor] if self.items else None
+
+    def run(self):
+        self._settings = termios.tcgetattr(self._fd)
+        tty.setraw(self._fd)
+        os.write(sys.stdout.fileno(), b"\x1b[?25l")
+        try:
+            self.load_page()
+            while True:
+                self.render()
+                key = self.read_key()
+                if self.searching:
+                    self.on_search_key(key)
+                elif not self.on_key(KEYS.get(key)):
+                    break
+        finally:
+            termios.tcsetattr(self._fd, termios.TCSADRAIN, self._settings)
+            os.write(sys.stdout.fileno(), b"\x1b[?25h\x1b[H\x1b[2J")
+
+    def on_search_key(self, key: bytes):
+        """搜索模式: 每输入或删除一个字符就重新查询第一页"""
+        if key in (b'\r', b'\n'):
+            self.searching = False
+            return
+        if key == b'\x1b':
+            self.searching = False
+            self.query = ''
+        elif key in (b'\x7f', b'\x08'):
+            self.query = self.query[:-1]
+        elif key[:1] == b'\x1b':
+            return
+        else:
+            text = key.decode('utf-8', errors='ignore')
+            self.query += ''.join(ch for ch in text if ch.isprintable())
+        self.page = self.cursor = 0
+        self.load_page()
+
+    def on_key(self, action: Optional[str]) -> bool:
+        """处理浏览模式的按键, 返回 False 表示退出"""
+        if action == 'quit':
+            return False
+        if action == 'up':
+            if self.cursor > 0:
+                self.cursor -= 1
+            elif self.page > 0:
+                self.page -= 1
+                self.cursor = self.page_size - 1
+                self.load_page()
+        elif action == 'down':
+            if self.cursor < len(self.items) - 1:
+                self.cursor += 1
+            elif self.has_next:
+                self.page += 1
+                self.cursor = 0
+                self.load_page()
+        elif action == 'prev' and self.page > 0:
+            self.page -= 1
+            self.load_page()
+        elif action == 'next' and self.has_next:
+            self.page += 1
+            self.load_page()
+        elif action == 'search':
+            self.searching = True
+        elif action == 'status':
+            self.status = (self.status + 1) % len(STATUSES)
+            self.page = self.cursor = 0
+            self.load_page()
+        elif action == 'type':
+            types = [*OBJECT_TYPES]
+            self.type = types[(types.index(self.type) + 1) % len(types)]
+            self.query, self.page, self.cursor = '', 0, 0
+            self.load_page()
+        elif action == 'enter' and self.selected:
+            self.show_details(self.selected)
+        elif action == 'add':
+            self.add()
+        elif action == 'complete' and self.selected:
+            self.complete(self.selected)
+        elif action == 'delete' and self.selected:
+            self.delete(self.selected)
+        return True
+
+    def show_details(self, obj: BaseObject):
+        """只读查看, 不写存储"""
+        lines = [f"=== {self.type} 详情 ===", ''] + [f"{key}: {value}" for key, value in obj.to_dict().items()]
+        os.write(sys.stdout.fileno(), ("\x1b[H\x1b[2J" + "\r\n".join(lines) + "\r\n\r\n按任意键返回").encode())
+        self.read_key()
+
+    def add(self):
+        title = self.prompt("标题")
+        if not title:
+            self.message = "已取消"
+            return
+        data = {'title': title, 'description': self.prompt("描述")}
+        if self.type == 'todo':
+            data['deadline'] = self.prompt("截止日期 (可选)")
+        else:
+            data['priority'] = self.choose("优先级", PRIORITIES, 'medium')
+            data['assignee'] = self.prompt("负责人 (可选)")
+        self.manager.add_objects([self.manager.create_object(data)])
+        self.message = f"已创建 '{title}'"
+        self.load_page()
+
+    def complete(self, obj: BaseObject):
+        if obj.completed:
+            self.message = f"'{obj.title}' 已经是完成状态"
+            return
+        obj.completed = True
+        self.manager.update_objects([obj])
+        self.message = f"已完成 #{obj.id} {obj.title}"
+        self.load_page()
+
+    def delete(self, obj: BaseObject):
+        self.message = f"删除 #{obj.id} {obj.title}? (y/n)"
+        self.render()
+        if self.read_key() not in (b'y', b'Y'):
+            self.message = "已取消"
+            return
+        self.manager.delete_objects([obj])
+        self.message = f"已删除 #{obj.id} {obj.title}"
+        self.load_page()
+
+
+def run_menu(type_: str = 'todo'):
+    imported = import_legacy()
+    if imported:
+        print(f"已从旧版菜单导入 {imported} 个待办事项")
+    ObjectMenu(type_).run()
@@ -1,80 +1,456 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
-from typing import Dict, List
+from collections import Counter
+from collections.abc import Mapping
+from contextlib import nullcontext
+from itertools import islice
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, ClassVar, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+import heapq
 import json
+import os
+import random
+import time
 from pathlib import Path
+from .search import SearchIndex, contains_terms, query_terms
+from .profiling import profiled
+from .sort_index import SortIndex, sort_fields, sort_key
+from .stats import StatsSummary, count_objects, plain
+from .storage import STORAGES, ConflictError, Storage, JournalStorage
+from .title_index import TitleIndex
 
+# 乐观并发冲突时的最多尝试次数
+CONFLICT_RETRIES = 10
+
+# 全文检索时每次按 id 读取并核对的命中数
+SEARCH_CHUNK = 256
+
+def slotted(cls):
+    """以 __slots__ 重新创建 dataclass, 实例不再携带 __dict__"""
+    inherited = {name for base in cls.__mro__[1:] for name in getattr(base, '__slots__', ())}
+    names = tuple(f.name for f in fields(cls) if f.name not in inherited)
+    namespace = {key: value for key, value in cls.__dict__.items()
+                 if key not in names + ('__dict__', '__weakref__')}
+    namespace['__slots__'] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+@slotted
 @dataclass
 class BaseObject:
     title: str
     description: str = ""
     completed: bool = False
+    id: int = 0
+
+    def to_dict(self) -> Dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
 
+@slotted
 @dataclass
 class Todo(BaseObject):
     deadline: str = ""
-    type: str = field(default="todo", init=False)
+    type: ClassVar[str] = "todo"
 
+# Job 可用的优先级
+PRIORITIES = ['low', 'medium', 'high']
+
+@slotted
 @dataclass
 class Job(BaseObject):
     priority: str = "medium"  # low, medium, high
     assignee: str = ""
-    type: str = field(default="job", init=False)
+    type: ClassVar[str] = "job"
+
+def retry_on_conflict(operation: Callable[[], Any], attempts: int = CONFLICT_RETRIES) -> Any:
+    """执行一次 "取版本号-读取-带版本写入" 的操作, 遇到 ConflictError 时稍等后重新执行"""
+    for attempt in range(attempts - 1):
+        try:
+            return operation()
+        except ConflictError:
+            time.sleep(random.uniform(0, 0.01 * (attempt + 1)))
+    return operation()
+
+def parse_target(target: str) -> Tuple[Optional[int], Optional[str]]:
+    """解析命令行中的对象引用, 返回 (id, 标题)
+
+    "#12" 只按 id 查找; 纯数字先按 id 查找, 没有该 id 时再当作标题; 其他都是标题。
+    """
+    if target.startswith('#') and target[1:].isdigit():
+        return int(target[1:]), None
+    if target.isdigit():
+        return int(target), target
+    return None, target
+
+@dataclass
+class Selection:
+    """批量查找的结果"""
+    objects: List[BaseObject] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    ambiguous: Dict[str, List[int]] = field(default_factory=dict)
+
+def select_objects(found: Dict[str, List[BaseObject]], all_: bool = False, **filters) -> Selection:
+    """合并 find_many 的结果: 按 id 去重并应用过滤条件
+
+    某个标题对应多个对象且未指定 all_ 时记入 ambiguous, 调用方不应执行任何修改。
+    """
+    selection, seen = Selection(), set()
+    for target, objects in found.items():
+        if not objects:
+            selection.missing.append(target)
+            continue
+        if len(objects) > 1 and not all_:
+            selection.ambiguous[target] = [obj.id for obj in objects]
+            continue
+        for obj in objects:
+            if obj.id not in seen and matches(obj, **filters):
+                seen.add(obj.id)
+                selection.objects.append(obj)
+    return selection
+
+def search_limit(offset: int, limit: Optional[int], filters: Dict) -> Optional[int]:
+    """没有其他过滤条件时, 全文检索只需从索引中取出前 offset + limit 个命中"""
+    if limit is None or any(value is not None for value in filters.values()):
+        return None
+    return offset + limit
+
+def matches(obj: BaseObject, query: Optional[str] = None, **filters) -> bool:
+    """判断对象是否满足关键词 (子串匹配标题或描述) 和字段过滤条件"""
+    for key, value in filters.items():
+        if value is not None and getattr(obj, key, None) != value:
+            return False
+    if query:
+        query = query.lower()
+        return query in obj.title.lower() or query in obj.description.lower()
+    return True
 
 class ObjectManager(ABC):
-    def __init__(self, file_path: Path):
+    object_cls: Type[BaseObject] = BaseObject
+
+    def __init__(self, file_path: Path, storage: Optional[Storage] = None):
         self.file_path = file_path
+        self.storage = storage or JournalStorage(file_path)
+        self.search_index = SearchIndex(self.sidecar_path('search.db'))
+        self.title_index = TitleIndex(self.sidecar_path('titles.db'))
+        self.sort_index = SortIndex(self.sidecar_path('sort.db'), sort_fields(self.object_cls))
+        self.indexes = [self.search_index, self.title_index, self.sort_index]
+        self.summary = StatsSummary(self.sidecar_path('stats.json'))
         self.ensure_file_exists()
 
+    def sidecar_path(self, suffix: str) -> Path:
+        """存放在存储文件旁的附属文件路径, 如 .todos.json.search.db"""
+        return self.file_path.with_name(f"{self.file_path.name}.{suffix}")
+
     def ensure_file_exists(self):
-        if not self.file_path.parent.exists():
-            self.file_path.parent.mkdir(parents=True)
-        if not self.file_path.exists():
-            self.save_objects([])
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.storage.exists():
+            return
+        # 多个进程同时首次使用时只有一个创建存储, 其余的在锁内看到已创建的文件
+        with self.storage.lock():
+            if not self.storage.exists():
+                self.save_objects([])
 
     @abstractmethod
     def create_object(self, data: Dict) -> BaseObject:
         pass
 
+    @profiled('load_objects')
     def load_objects(self) -> List[BaseObject]:
-        try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [self.create_object(item) for item in data]
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
+        return [self.create_object(item) for item in self.storage.load()]
+
+    @profiled('get_objects')
+    def get_objects(self, ids: Iterable[int]) -> List[BaseObject]:
+        """按 id 取对象, 结果保持 ids 的顺序, 不存在的 id 被忽略"""
+        return [self.create_object(record) for record in self.storage.get(ids)]
 
+    def version(self) -> Any:
+        """存储的当前版本号; 读取-修改-写入时先取版本号再读取, 写入时作为 expected_version 传回"""
+        return self.storage.version()
+
+    @profiled('save_objects')
     def save_objects(self, objects: List[BaseObject]):
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump([obj.__dict__ for obj in objects], f, ensure_ascii=False, indent=4)
+        """整体重写存储"""
+        with self._write_lock():
+            self._replace(objects)
+            self.summary.save(count_objects(objects), self.version())
+        for index in self.indexes:
+            index.rebuild(objects)
+
+    def add_objects(self, objects: Iterable[BaseObject]):
+        """追加新对象并为其分配 id"""
+        self.update_objects(objects)
+
+    @profiled('update_objects')
+    def update_objects(self, objects: Iterable[BaseObject], expected_version: Any = None) -> Any:
+        """写入对象的当前状态, 只追加变更而不重写整个存储, 返回写入后的版本号
+
+        给出 expected_version 时, 若这些对象在此版本之后被其他进程修改过则抛出 ConflictError。
+        """
+        objects = list(objects)
+        with self._write_lock():
+            before = self.version()
+            # 统计摘要需要减去被覆盖的旧状态
+            ids = [obj.id for obj in objects if obj.id] if self.summary.exists() else []
+            previous = self.get_objects(ids) if ids else []
+            version = self._put(objects, expected_version)
+            self.summary.apply(before, version, added=objects, removed=previous)
+        for index in self.indexes:
+            index.put(objects)
+        return version
+
+    @profiled('delete_objects')
+    def delete_objects(self, objects: Iterable[BaseObject], expected_version: Any = None) -> Any:
+        objects = list(objects)
+        with self._write_lock():
+            before = self.version()
+            version = self._delete(objects, expected_version)
+            self.summary.apply(before, version, removed=objects)
+        for index in self.indexes:
+            index.delete(objects)
+        return version
+
+    def _write_lock(self):
+        """写入存储和更新统计摘要期间持有存储锁, 使两者对其他进程是原子的"""
+        return self.storage.lock() if self.storage is not None else nullcontext()
+
+    def stats(self) -> Counter:
+        """从统计摘要读取计数器 (见 stats.object_counts); 摘要不存在或已过期时整体重建"""
+        summary = self.summary.load()
+        if summary is None or summary['version'] != plain(self.version()):
+            return self.rebuild_stats()
+        return Counter(summary['counts'])
+
+    @profiled('rebuild_stats')
+    def rebuild_stats(self) -> Counter:
+        with self._write_lock():
+            counts = count_objects(self.iter_objects())
+            self.summary.save(counts, self.version())
+        return counts
+
+    def check_stats(self) -> Optional[Dict[str, Tuple[int, int]]]:
+        """对照存储核对统计摘要, 返回不一致的计数器 {键: (摘要中的值, 实际值)}
+
+        摘要尚未建立 (新建的存储, 或旧版本创建的存储) 时没有可核对的内容, 建立摘要后返回 None。
+        """
+        with self._write_lock():
+            summary = self.summary.load()
+            actual = count_objects(self.iter_objects())
+            if summary is None:
+                self.summary.save(actual, self.version())
+                return None
+        recorded = Counter(summary['counts'])
+        return {key: (recorded[key], actual[key]) for key in sorted(set(recorded) | set(actual))
+                if recorded[key] != actual[key]}
+
+    def _replace(self, objects: List[BaseObject]):
+        records = [obj.to_dict() for obj in objects]
+        self.storage.replace(records)
+        self._sync_ids(objects, records)
+
+    def _put(self, objects: List[BaseObject], expected_version: Any = None) -> Any:
+        records = [obj.to_dict() for obj in objects]
+        version = self.storage.apply(puts=records, expected_version=expected_version)
+        self._sync_ids(objects, records)
+        return version
+
+    def _delete(self, objects: List[BaseObject], expected_version: Any = None) -> Any:
+        return self.storage.apply(deletes=[obj.id for obj in objects],
+                                  expected_version=expected_version)
+
+    def find_by_title(self, title: str) -> List[BaseObject]:
+        """通过标题索引查找标题完全相同的对象, 按 id 排序"""
+        return self.find_by_titles([title])[title]
+
+    def find_by_titles(self, titles: Iterable[str]) -> Dict[str, List[BaseObject]]:
+        """批量按标题查找, 所有对象一次读取"""
+        if not self.title_index.exists():
+            self.title_index.rebuild(self.load_objects())
+        ids = self.title_index.lookup_many(titles)
+        by_id = {obj.id: obj for obj in self.get_objects(id_ for matched in ids.values() for id_ in matched)}
+        return {title: [by_id[id_] for id_ in matched if id_ in by_id and by_id[id_].title == title]
+                for title, matched in ids.items()}
+
+    def find(self, target: str) -> List[BaseObject]:
+        """按命令行中的对象引用查找, 规则见 parse_target"""
+        return self.find_many([target])[target]
+
+    @profiled('find_many')
+    def find_many(self, targets: Iterable[str]) -> Dict[str, List[BaseObject]]:
+        """批量解析对象引用, 返回 {引用: 匹配的对象}; 先一次按 id 读取, 再一次按标题查找"""
+        parsed = {target: parse_target(target) for target in targets}
+        by_id = {obj.id: obj for obj in self.get_objects(
+            dict.fromkeys(id_ for id_, _ in parsed.values() if id_ is not None))}
+        found = {target: [by_id[id_]] for target, (id_, _) in parsed.items() if id_ in by_id}
+        by_title = self.find_by_titles(dict.fromkeys(
+            title for target, (_, title) in parsed.items() if target not in found and title is not None))
+        for target, (_, title) in parsed.items():
+            if target not in found:
+                found[target] = by_title.get(title, [])
+        return {target: found[target] for target in parsed}
+
+    def select(self, targets: Iterable[str] = (), all_: bool = False, **filters) -> Selection:
+        """按对象引用和/或过滤条件选出对象; 没有给出引用时选出满足过滤条件的全部对象"""
+        targets = list(targets)
+        if targets:
+            return select_objects(self.find_many(targets), all_, **filters)
+        return Selection(objects=list(self.iter_objects(**filters)))
+
+    @profiled('search')
+    def search(self, query: str, limit: Optional[int] = None) -> Optional[Iterator[BaseObject]]:
+        """通过倒排索引检索, 按相关度排序逐个产出对象; 查询无法使用索引时返回 None
+
+        limit 限制从索引中取出的命中数。命中的对象按块读取并核对, 调用者停止迭代后
+        不再读取其余的命中, 因此只取前几项的查询与命中总数无关。
+        """
+        terms = query_terms(query)
+        if not terms:
+            return None
+        if not self.search_index.exists():
+            self.search_index.rebuild(self.load_objects())
+        return self._iter_hits(query, terms, self.search_index.search(query, limit), limit)
+
+    def _iter_hits(self, query: str, terms: List[Tuple[str, bool]], ids: List[int],
+                   limit: Optional[int]) -> Iterator[BaseObject]:
+        """按块读取命中的对象; 对象缺失或与查询不符时 (存储被绕过管理器修改, 如切换存储引擎)
+        重建索引后重新检索, 已产出的对象不再重复产出"""
+        yielded = set()
+        for attempt in range(2):
+            stale = False
+            for start in range(0, len(ids), SEARCH_CHUNK):
+                chunk = [id_ for id_ in ids[start:start + SEARCH_CHUNK] if id_ not in yielded]
+                objects = self.get_objects(chunk)
+                if attempt == 0 and (len(objects) < len(chunk)
+                                     or not all(contains_terms(obj, terms) for obj in objects)):
+                    stale = True
+                    break
+                for obj in objects:
+                    if contains_terms(obj, terms):
+                        yielded.add(obj.id)
+                        yield obj
+            if not stale:
+                return
+            self.search_index.rebuild(self.load_objects())
+            ids = self.search_index.search(query, limit)
+
+    @profiled('iter_objects', lazy=True)
+    def iter_objects(self, query: Optional[str] = None, offset: int = 0,
+                     limit: Optional[int] = None, **filters) -> Iterator[BaseObject]:
+        """按关键词 (匹配标题或描述) 和字段值过滤对象, 值为 None 的过滤条件被忽略
+
+        边读取存储边产出对象, 读够 offset + limit 个即停止。
+        """
+        objects = self.search(query, search_limit(offset, limit, filters)) if query else None
+        if objects is not None:
+            matched = (obj for obj in objects if matches(obj, **filters))
+        else:
+            matched = (obj for obj in map(self.create_object, self.storage.iter_records())
+                       if matches(obj, query, **filters))
+        return islice(matched, offset, None if limit is None else offset + limit)
+
+    @profiled('top')
+    def top(self, sort: str, k: Optional[int] = None, query: Optional[str] = None,
+            below: Optional[int] = None, **filters) -> List[BaseObject]:
+        """按 sort 字段 (见 sort_index.SORT_FIELDS) 排序后的前 k 个对象, k 为 None 时返回全部
+
+        只按完成状态过滤时直接按排序索引的顺序读取前 k 项; 有其他过滤条件时边读取边用堆
+        选出前 k 个, 不对整个存储排序。below 只保留字段键小于它的对象, 如已逾期的待办。
+        """
+        if not query and all(value is None for name, value in filters.items() if name != 'completed'):
+            return self._top_from_index(sort, k, filters.get('completed'), below)
+        key = sort_key(sort)
+        matched = self.iter_objects(query, **filters)
+        if below is not None:
+            matched = (obj for obj in matched if key(obj)[0] < below)
+        return sorted(matched, key=key) if k is None else heapq.nsmallest(k, matched, key=key)
+
+    def _top_from_index(self, sort: str, k: Optional[int], completed: Optional[bool],
+                        below: Optional[int]) -> List[BaseObject]:
+        """读取索引的前 k 项后按 id 取对象; 对象与索引不一致 (存储被绕过管理器修改) 时重建索引再查一次"""
+        key = sort_key(sort)
+        for attempt in range(2):
+            if attempt or not self.sort_index.exists():
+                self.sort_index.rebuild(self.iter_objects())
+            rows = self.sort_index.top(sort, k, completed, below)
+            objects = self.get_objects(id_ for id_, _, _ in rows)
+            if [(obj.id, int(obj.completed), key(obj)[0]) for obj in objects] == rows:
+                break
+        return objects
+
+    @staticmethod
+    def _sync_ids(objects: List[BaseObject], records: List[Dict]):
+        for obj, record in zip(objects, records):
+            obj.id = record['id']
 
 class TodoManager(ObjectManager):
+    object_cls = Todo
+
     def create_object(self, data: Dict) -> Todo:
         return Todo(**data)
 
 class JobManager(ObjectManager):
+    object_cls = Job
+
     def create_object(self, data: Dict) -> Job:
         return Job(**data)
 
 TODO_FILE = Path.home() / "todo/.todos.json"
 JOB_FILE = Path.home() / "todo/.jobs.json"
+TODO_DB_FILE = Path.home() / "todo/.todos.db"
+JOB_DB_FILE = Path.home() / "todo/.jobs.db"
+
+CONFIG_FILE = Path.home() / "todo/config.json"
+
+def load_config() -> Dict:
+    """读取 ~/todo/config.json, 环境变量 TODO_STORAGE、TODO_FORMAT 可覆盖存储引擎和快照格式"""
+    try:
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError):
+        config = {}
+    if os.environ.get('TODO_STORAGE'):
+        config['storage'] = os.environ['TODO_STORAGE']
+    if os.environ.get('TODO_FORMAT'):
+        config['format'] = os.environ['TODO_FORMAT']
+    return config
+
+OBJECT_TYPES = {
+    'todo': (Todo, TodoManager, TODO_FILE, TODO_DB_FILE),
+    'job': (Job, JobManager, JOB_FILE, JOB_DB_FILE),
+}
+
+def create_manager(type_: str, config: Dict) -> ObjectManager:
+    object_cls, manager_cls, file_path, db_path = OBJECT_TYPES[type_]
+    if config.get('storage') == 'sqlite':
+        from .sqlite_manager import SqliteObjectManager
+        return SqliteObjectManager(db_path, object_cls)
+    storage_cls = STORAGES[config.get('storage', 'journal')]
+    return manager_cls(file_path, storage_cls(file_path, config.get('format')))
+
+def create_managers(config: Dict) -> Dict[str, ObjectManager]:
+    return {type_: create_manager(type_, config) for type_ in OBJECT_TYPES}
+
+class ManagerRegistry(Mapping):
+    """按需创建管理器: 第一次访问某个类型时才读取配置并初始化对应的存储"""
 
-# print(TODO_FILE)
-# print(JOB_FILE)
+    def __init__(self):
+        self._config = None
+        self._managers = {}
 
-# 确保 ToDo 文件与安装包目录隔离，如果不存在则创建
-if not TODO_FILE.parent.exists():
-    TODO_FILE.parent.mkdir(parents=True)
-    with open(TODO_FILE, "w") as f:
-        json.dump([], f)
+    def __getitem__(self, type_: str) -> ObjectManager:
+        if type_ not in self._managers:
+            if type_ not in OBJECT_TYPES:
+                raise KeyError(type_)
+            if self._config is None:
+                self._config = load_config()
+            self._managers[type_] = create_manager(type_, self._config)
+        return self._managers[type_]
 
-if not JOB_FILE.parent.exists():
-    JOB_FILE.parent.mkdir(parents=True)
-    with open(JOB_FILE, "w") as f:
-        json.dump([], f)
+    def __contains__(self, type_) -> bool:
+        return type_ in OBJECT_TYPES
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(OBJECT_TYPES)
+
+    def __len__(self) -> int:
+        return len(OBJECT_TYPES)
 
 # 管理器实例
-MANAGERS = {
-    'todo': TodoManager(TODO_FILE),
-    'job': JobManager(JOB_FILE)
-}
+MANAGERS = ManagerRegistry()
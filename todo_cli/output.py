@@ -0,0 +1,164 @@
+"""list 的输出格式
+
+    todo list job --format jsonl
+    todo list job --format csv --fields id,title,assignee
+
+text 为原有的分段文本; table 为按列对齐的表格; jsonl、csv、tsv 供脚本读取,
+布尔值统一写作 true/false。所有格式都边读取对象边写入同一个大缓冲区的输出流,
+缓冲区满时才写一次标准输出, 导出大存储时不会被逐行 echo 的开销拖慢。
+"""
+import io
+import json
+import os
+import sys
+import unicodedata
+from contextlib import contextmanager
+from dataclasses import fields as dataclass_fields
+from itertools import chain, islice
+from operator import attrgetter
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+FORMATS = ['text', 'table', 'jsonl', 'csv', 'tsv']
+
+BUFFER_SIZE = 1 << 20
+
+# table 格式按前若干行计算列宽, 单列最宽显示的宽度
+TABLE_SAMPLE = 1000
+TABLE_MAX_WIDTH = 40
+
+# table 格式默认显示的字段, 对象类型中不存在的被跳过
+TABLE_FIELDS = ['id', 'completed', 'title', 'deadline', 'priority', 'assignee']
+
+
+def display_width(text: str) -> int:
+    """终端显示宽度 (中文占两列)"""
+    if text.isascii():
+        return len(text)
+    return sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+
+
+def truncate(text: str, width: int) -> str:
+    """按终端显示宽度截断"""
+    used = 0
+    for i, ch in enumerate(text):
+        used += 2 if unicodedata.east_asian_width(ch) in 'WF' else 1
+        if used > width:
+            return text[:i]
+    return text
+
+
+def object_fields(object_cls) -> List[str]:
+    return [f.name for f in dataclass_fields(object_cls)]
+
+
+def resolve_fields(object_cls, fmt: str, names: Optional[str]) -> List[str]:
+    """解析 --fields (逗号分隔); 未给出时 table 使用 TABLE_FIELDS, 其余格式使用全部字段"""
+    available = object_fields(object_cls)
+    if not names:
+        return [name for name in TABLE_FIELDS if name in available] if fmt == 'table' else available
+    selected = [name.strip() for name in names.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)} (可用: {', '.join(available)})")
+    return selected
+
+
+def format_value(value) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def format_text(type_: str, obj, label: Optional[str] = None) -> str:
+    """原有的分段文本格式"""
+    lines = [f"{label or ('[完成]' if obj.completed else '[待办]')} #{obj.id} {obj.title}"]
+    if obj.description:
+        lines.append(f"  描述: {obj.description}")
+    if type_ == 'todo' and getattr(obj, 'deadline', ''):
+        lines.append(f"  截止日期: {obj.deadline}")
+    elif type_ == 'job':
+        lines.append(f"  优先级: {obj.priority}")
+        if obj.assignee:
+            lines.append(f"  负责人: {obj.assignee}")
+    lines.append("---\n")
+    return "\n".join(lines)
+
+
+@contextmanager
+def open_output() -> Iterator[TextIO]:
+    """标准输出上的大缓冲区文本流; 下游提前关闭管道 (如 | head) 时安静地结束"""
+    sys.stdout.flush()
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        # 标准输出被替换为没有文件描述符的对象 (如 todo bench、测试中捕获输出), 直接写入它
+        yield sys.stdout
+        return
+    out = open(fd, 'w', encoding='utf-8', newline='', buffering=BUFFER_SIZE, closefd=False)
+    try:
+        yield out
+        out.flush()
+    except BrokenPipeError:
+        # 把标准输出指向 /dev/null, 避免解释器退出时刷新缓冲区再次报错
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        try:
+            out.close()
+        except BrokenPipeError:
+            pass
+
+
+def write_objects(out: TextIO, type_: str, objects: Iterable, fmt: str = 'text',
+                  names: Optional[List[str]] = None) -> int:
+    """按 fmt 把对象写入 out, 返回写出的对象数"""
+    count = 0
+
+    def counted(items):
+        nonlocal count
+        for item in items:
+            count += 1
+            yield item
+
+    objects = counted(objects)
+    # attrgetter 一次取出所有字段, 只给出一个字段时也返回元组
+    values = attrgetter(*names) if len(names or ()) > 1 else lambda obj: (getattr(obj, names[0]),)
+    if fmt == 'text':
+        out.writelines(format_text(type_, obj) for obj in objects)
+    elif fmt == 'jsonl':
+        # 复用同一个编码器; json.dumps 带参数时每次调用都会新建一个
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        out.writelines(encode(dict(zip(names, values(obj)))) + '\n' for obj in objects)
+    elif fmt in ('csv', 'tsv'):
+        # cli 在启动时导入本模块取得 FORMATS, csv 只在需要时导入
+        import csv
+        writer = csv.writer(out, dialect='excel-tab' if fmt == 'tsv' else 'excel', lineterminator='\n')
+        writer.writerow(names)
+        writer.writerows([format_value(value) for value in values(obj)] for obj in objects)
+    elif fmt == 'table':
+        write_table(out, (values(obj) for obj in objects), names)
+    else:
+        raise ValueError(f"未知的输出格式: {fmt}")
+    return count
+
+
+def write_table(out: TextIO, records: Iterator[tuple], names: List[str]):
+    """按前 TABLE_SAMPLE 行计算列宽, 之后的行按同样的列宽截断, 不需要先读完全部对象"""
+    rows = ([format_value(value).replace('\n', ' ') for value in record] for record in records)
+    sample = [*islice(rows, TABLE_SAMPLE)]
+    widths = [min(TABLE_MAX_WIDTH, max([display_width(name)] + [display_width(row[i]) for row in sample]))
+              for i, name in enumerate(names)]
+
+    def line(cells):
+        parts = []
+        for cell, width in zip(cells, widths):
+            used = display_width(cell)
+            if used > width:
+                cell = truncate(cell, width)
+                used = display_width(cell)
+            parts.append(cell + ' ' * (width - used))
+        return '  '.join(parts).rstrip() + '\n'
+
+    out.write(line(names))
+    out.write(line('-' * width for width in widths))
+    out.writelines(line(row) for row in chain(sample, rows))
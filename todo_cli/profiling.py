@@ -0,0 +1,181 @@
+"""命令执行过程的计时和计数
+
+    todo --profile list job                    各阶段的统计输出到标准错误
+    todo --profile-output list.pstats list job 同时保存 cProfile 统计 (python -m pstats 查看)
+    todo --metrics-log metrics.jsonl list job  统计以一行 JSON 追加到文件
+    TODO_PROFILE=1 TODO_METRICS_LOG=metrics.jsonl todo list job
+
+按阶段 (import、load_objects、iter_objects、save_objects、daemon、handshake 等) 累计
+耗时、调用次数和对象数; 读写字节数取阶段前后 /proc/self/io 中 rchar/wchar 的差值,
+包含该阶段内的全部 read/write 系统调用 (不含 mmap 访问, 非 Linux 系统上为 0)。
+嵌套的阶段同时计入外层。逐个产出对象的阶段只统计读取的字节, 因为消费者写出的
+输出也发生在迭代期间。未启用时每个埋点只多一次属性判断。
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# cli 最先导入本模块, 从这里到命令开始执行的时间记为 import 阶段
+STARTED = time.perf_counter()
+
+
+def io_counters() -> Tuple[int, int]:
+    """进程累计通过 read/write 读写的字节数"""
+    try:
+        with open('/proc/self/io', 'rb') as f:
+            fields = dict(line.split(b':', 1) for line in f.read().splitlines() if b':' in line)
+    except OSError:
+        return 0, 0
+    return int(fields.get(b'rchar', 0)), int(fields.get(b'wchar', 0))
+
+
+class Phase:
+    __slots__ = ('seconds', 'calls', 'objects', 'read', 'written')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = self.objects = self.read = self.written = 0
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.phases: Dict[str, Phase] = {}
+        self.command = None
+        self.args: List[str] = []
+        self._started = None
+        self._cprofile = None
+
+    def start(self, command: Optional[str], args: List[str], cprofile: bool = False):
+        self.enabled = True
+        self.command, self.args = command, args
+        self._started = time.perf_counter()
+        # 此前读写的字节 (解释器启动、导入模块) 都计入 import 阶段
+        phase = self.phase_stats('import')
+        phase.calls, phase.seconds = 1, self._started - STARTED
+        phase.read, phase.written = io_counters()
+        if cprofile:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def phase_stats(self, name: str) -> Phase:
+        if name not in self.phases:
+            self.phases[name] = Phase()
+        return self.phases[name]
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[Phase]:
+        phase = self.phase_stats(name)
+        read, written = io_counters()
+        start = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            phase.seconds += time.perf_counter() - start
+            phase.calls += 1
+            now_read, now_written = io_counters()
+            phase.read += now_read - read
+            phase.written += now_written - written
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """逐个产出 iterable 的元素, 只把取下一个元素的时间计入阶段"""
+        phase = self.phase_stats(name)
+        read = io_counters()[0]
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    phase.seconds += time.perf_counter() - start
+                phase.objects += 1
+                yield item
+        finally:
+            phase.read += io_counters()[0] - read
+
+    def snapshot(self) -> Dict:
+        read, written = io_counters()
+        return {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'pid': os.getpid(),
+            'command': self.command,
+            'args': self.args,
+            'seconds': time.perf_counter() - STARTED,
+            'read': read,
+            'written': written,
+            'phases': {name: phase.to_dict() for name, phase in self.phases.items()},
+        }
+
+    def finish(self, report: bool = False, pstats_path: Optional[str] = None,
+               log_path: Optional[str] = None):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            if pstats_path:
+                self._cprofile.dump_stats(pstats_path)
+        result = self.snapshot()
+        self.enabled = False
+        if log_path:
+            # 一次 O_APPEND 写入一整行, 多个进程同时追加也不会交错
+            fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (json.dumps(result, ensure_ascii=False) + '\n').encode('utf-8'))
+            finally:
+                os.close(fd)
+        if report:
+            sys.stderr.write(format_report(result))
+            sys.stderr.flush()
+
+
+def format_size(size: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_report(result: Dict) -> str:
+    # 表头中每个汉字占两列, 对齐宽度相应减少
+    lines = [f"[profile] {result['command'] or ''} 总耗时 {result['seconds'] * 1000:.1f} ms  "
+             f"读 {format_size(result['read'])}  写 {format_size(result['written'])}",
+             f"  {'阶段':<16}{'耗时 ms':>8}{'次数':>6}{'对象数':>7}{'读':>11}{'写':>11}"]
+    for name, phase in result['phases'].items():
+        lines.append(f"  {name:<18}{phase['seconds'] * 1000:>10.1f}{phase['calls']:>8}{phase['objects']:>10}"
+                     f"{format_size(phase['read']):>12}{format_size(phase['written']):>12}")
+    return '\n'.join(lines) + '\n'
+
+
+PROFILER = Profiler()
+
+
+def profiled(name: str, lazy: bool = False) -> Callable:
+    """把函数 (方法) 的调用计入名为 name 的阶段
+
+    返回列表时列表长度计为对象数, 否则第一个参数 (方法为 self 之后的参数) 是列表时以其长度计;
+    lazy 为 True 时函数返回迭代器, 迭代的时间和产出的对象也计入该阶段。
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with PROFILER.phase(name) as phase:
+                result = func(*args, **kwargs)
+                if isinstance(result, list):
+                    phase.objects += len(result)
+                elif len(args) > 1 and isinstance(args[1], list):
+                    phase.objects += len(args[1])
+            return PROFILER.iterate(name, result) if lazy else result
+        return wrapper
+    return decorate
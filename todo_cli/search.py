@@ -0,0 +1,131 @@
+"""全文检索: 存放在存储文件旁的倒排索引 (词 -> 对象 id)
+
+中日韩文字按单字和相邻两字 (bigram) 切分, 其他文字按单词切分。查询中的
+中文按 bigram 精确匹配, 英文单词按前缀匹配, 结果按命中权重排序
+(标题中的词权重更高)。索引在创建/修改/删除对象时增量更新, 文件不存在时
+会在首次查询时整体重建。
+"""
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_RUN_RE = re.compile(f'[{CJK}]+|[^\\W{CJK}]+')
+
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+
+def _is_cjk(run: str) -> bool:
+    return bool(re.match(f'[{CJK}]', run))
+
+
+def tokenize(text: str) -> List[str]:
+    """切分用于建索引的词: 中文产出单字和 bigram, 其他文字产出小写单词"""
+    tokens = []
+    for run in _RUN_RE.findall(text.lower()):
+        if _is_cjk(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def query_terms(query: str) -> List[Tuple[str, bool]]:
+    """切分查询, 返回 (词, 是否前缀匹配) 列表"""
+    terms = []
+    for run in _RUN_RE.findall(query.lower()):
+        if not _is_cjk(run):
+            terms.append((run, True))
+        elif len(run) == 1:
+            terms.append((run, False))
+        else:
+            terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+    return list(dict.fromkeys(terms))
+
+
+def contains_terms(obj, terms: List[Tuple[str, bool]]) -> bool:
+    """对象的标题或描述是否包含全部查询词 (匹配规则与索引相同), 用于剔除过期索引的命中"""
+    tokens = set(tokenize(obj.title)) | set(tokenize(obj.description))
+    return all(any(t.startswith(token) for t in tokens) if prefix else token in tokens
+               for token, prefix in terms)
+
+
+class SearchIndex:
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
+        self._conn = None
+
+    def exists(self) -> bool:
+        return self._conn is not None or self.file_path.exists()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            # 只有真正读写索引时才导入 sqlite3, 避免拖慢不涉及检索的命令
+            import sqlite3
+            self._conn = sqlite3.connect(str(self.file_path))
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS postings (token TEXT, id INTEGER, weight INTEGER, "
+                    "PRIMARY KEY (token, id)) WITHOUT ROWID")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS postings_id ON postings (id)")
+        return self._conn
+
+    @staticmethod
+    def _postings(obj) -> Iterable[Tuple[str, int, int]]:
+        weights = Counter()
+        for token in tokenize(obj.title):
+            weights[token] += TITLE_WEIGHT
+        for token in tokenize(obj.description):
+            weights[token] += DESCRIPTION_WEIGHT
+        return [(token, obj.id, weight) for token, weight in weights.items()]
+
+    def put(self, objects: Iterable):
+        """写入或更新对象的词条; 索引尚未建立时跳过, 等首次查询时整体重建"""
+        if not self.exists():
+            return
+        with self.conn:
+            self._delete_ids([obj.id for obj in objects])
+            for obj in objects:
+                self.conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", self._postings(obj))
+
+    def delete(self, objects: Iterable):
+        if not self.exists():
+            return
+        with self.conn:
+            self._delete_ids([obj.id for obj in objects])
+
+    def _delete_ids(self, ids: List[int]):
+        self.conn.executemany("DELETE FROM postings WHERE id = ?", [(id_,) for id_ in ids])
+
+    def rebuild(self, objects: Iterable):
+        with self.conn:
+            self.conn.execute("DELETE FROM postings")
+            for obj in objects:
+                self.conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", self._postings(obj))
+
+    def search(self, query: str, limit: Optional[int] = None) -> Optional[List[int]]:
+        """返回按相关度排序的对象 id; 查询中没有可检索的词时返回 None"""
+        terms = query_terms(query)
+        if not terms:
+            return None
+        parts, params = [], []
+        for n, (token, prefix) in enumerate(terms):
+            if prefix:
+                parts.append(f"SELECT id, weight, {n} AS term FROM postings WHERE token >= ? AND token < ?")
+                params += [token, token + '\U0010ffff']
+            else:
+                parts.append(f"SELECT id, weight, {n} AS term FROM postings WHERE token = ?")
+                params.append(token)
+        sql = (f"SELECT id FROM ({' UNION ALL '.join(parts)}) GROUP BY id "
+               f"HAVING COUNT(DISTINCT term) = ? ORDER BY SUM(weight) DESC, id LIMIT ?")
+        params += [len(terms), -1 if limit is None else limit]
+        return [row[0] for row in self.conn.execute(sql, params)]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
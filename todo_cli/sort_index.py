@@ -0,0 +1,148 @@
+"""排序索引: 存放在存储文件旁的 截止日期/优先级 -> id 有序索引
+
+截止日期和优先级以自由格式的字符串保存, 写入对象时解析一次, 转换为可直接比较的
+整数键存入此索引; list --sort / todo due 按键的顺序读取前 k 项, 不需要扫描和排序
+整个存储。索引在创建/修改/删除对象时增量更新, 文件不存在时会在首次查询时整体重建。
+"""
+import re
+import time
+from dataclasses import fields
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+# 无法解析的截止日期使用的键, 大于任何日期, 排在最后
+NO_DEADLINE = 10 ** 12
+
+PRIORITY_ORDER = {'high': 0, 'medium': 1, 'low': 2}
+
+_DATE = re.compile(r'(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?(?:[ T]+(\d{1,2})[:：](\d{2})(?::\d{2})?)?$')
+_COMPACT_DATE = re.compile(r'(\d{4})(\d{2})(\d{2})(?:[ T]?(\d{2})(\d{2}))?$')
+
+
+@lru_cache(maxsize=4096)
+def deadline_key(text: str) -> Optional[int]:
+    """把截止日期解析为 YYYYMMDDHHMM 形式的整数, 无法解析时返回 None
+
+    支持 2024-05-01、2024/5/1、2024年5月1日、20240501, 以及后面跟 HH:MM 的写法;
+    只有日期时视为当天 23:59 截止。
+    """
+    text = text.strip()
+    match = _DATE.match(text) or _COMPACT_DATE.match(text)
+    if not match:
+        return None
+    year, month, day = (int(part) for part in match.group(1, 2, 3))
+    hour, minute = (23, 59) if match.group(4) is None else (int(match.group(4)), int(match.group(5)))
+    if not (1 <= month <= 12 and 1 <= day <= 31 and hour < 24 and minute < 60):
+        return None
+    return ((((year * 100 + month) * 100 + day) * 100 + hour) * 100) + minute
+
+
+def now_key() -> int:
+    """当前时间对应的截止日期键"""
+    return int(time.strftime('%Y%m%d%H%M'))
+
+
+def priority_key(text: str) -> int:
+    return PRIORITY_ORDER.get(text, len(PRIORITY_ORDER))
+
+
+# 可排序的字段及其键函数
+SORT_FIELDS = {
+    'deadline': lambda obj: deadline_key(obj.deadline) or NO_DEADLINE,
+    'priority': lambda obj: priority_key(obj.priority),
+}
+
+
+def sort_fields(object_cls) -> List[str]:
+    """对象类型中可排序的字段"""
+    names = {f.name for f in fields(object_cls)}
+    return [name for name in SORT_FIELDS if name in names]
+
+
+def sort_key(name: str) -> Callable:
+    """对象的排序键: (字段键, id), 键相同时按 id 排序"""
+    key = SORT_FIELDS[name]
+    return lambda obj: (key(obj), obj.id)
+
+
+class SortIndex:
+    def __init__(self, file_path: Path, names: List[str]):
+        self.file_path = file_path
+        self.names = names
+        self._conn = None
+
+    def exists(self) -> bool:
+        return self._conn is not None or self.file_path.exists()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            import sqlite3
+            self._conn = sqlite3.connect(str(self.file_path))
+            columns = ''.join(f", {name} INTEGER" for name in self.names)
+            with self._conn:
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS sort_keys "
+                                   f"(id INTEGER PRIMARY KEY, completed INTEGER{columns})")
+                self._create_indexes()
+        return self._conn
+
+    def _create_indexes(self):
+        for name in self.names:
+            # 分别覆盖不过滤和按完成状态过滤的有序读取
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS sort_{name} ON sort_keys ({name})")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS sort_completed_{name} "
+                               f"ON sort_keys (completed, {name})")
+
+    def _rows(self, objects: Iterable) -> Iterable[Tuple]:
+        keys = [SORT_FIELDS[name] for name in self.names]
+        return ((obj.id, int(obj.completed), *(key(obj) for key in keys)) for obj in objects)
+
+    def _insert(self, objects: Iterable):
+        placeholders = ', '.join('?' * (len(self.names) + 2))
+        self.conn.executemany(f"INSERT OR REPLACE INTO sort_keys VALUES ({placeholders})", self._rows(objects))
+
+    def put(self, objects: Iterable):
+        """写入或更新对象的排序键; 索引尚未建立时跳过, 等首次查询时整体重建"""
+        if not self.exists():
+            return
+        with self.conn:
+            self._insert(objects)
+
+    def delete(self, objects: Iterable):
+        if not self.exists():
+            return
+        with self.conn:
+            self.conn.executemany("DELETE FROM sort_keys WHERE id = ?", [(obj.id,) for obj in objects])
+
+    def rebuild(self, objects: Iterable):
+        """先写入全部行再建立有序索引, 比逐行维护索引快得多"""
+        with self.conn:
+            for name in self.names:
+                self.conn.execute(f"DROP INDEX IF EXISTS sort_{name}")
+                self.conn.execute(f"DROP INDEX IF EXISTS sort_completed_{name}")
+            self.conn.execute("DELETE FROM sort_keys")
+            self._insert(objects)
+            self._create_indexes()
+
+    def top(self, name: str, k: Optional[int] = None, completed: Optional[bool] = None,
+            below: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """按 name 的键顺序返回前 k 项 (id, completed, 键); below 只保留键小于它的项"""
+        if name not in self.names:
+            raise ValueError(f"排序索引中没有 {name}")
+        conditions, params = [], []
+        if completed is not None:
+            conditions.append("completed = ?")
+            params.append(int(completed))
+        if below is not None:
+            conditions.append(f"{name} < ?")
+            params.append(below)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        params.append(-1 if k is None else k)
+        return self.conn.execute(f"SELECT id, completed, {name} FROM sort_keys {where} "
+                                 f"ORDER BY {name}, id LIMIT ?", params).fetchall()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,188 @@
+"""基于 SQLite 的对象管理器, 可替代 TodoManager/JobManager
+
+按标题、完成状态、优先级、负责人和截止日期建立索引, 标题查找和字段过滤
+由 SQLite 通过索引完成, 不需要加载整个存储。
+"""
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import fields
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Type
+
+from .objects import BaseObject, ObjectManager, matches, search_limit
+from .profiling import profiled
+from .storage import ConflictError
+from .search import SearchIndex
+from .sort_index import SortIndex, sort_fields
+from .stats import StatsSummary
+
+SQL_TYPES = {str: 'TEXT', bool: 'INTEGER', int: 'INTEGER'}
+
+# 需要建立索引的列, 对象类型中不存在的列会被跳过
+INDEXED_COLUMNS = ['title', 'completed', 'priority', 'assignee', 'deadline']
+
+
+class SqliteObjectManager(ObjectManager):
+    def __init__(self, file_path: Path, object_cls: Type[BaseObject]):
+        self.object_cls = object_cls
+        self.columns = [f.name for f in fields(object_cls) if f.init]
+        self._conn = None
+        self.file_path = file_path
+        self.storage = None
+        self.search_index = SearchIndex(self.sidecar_path('search.db'))
+        self.sort_index = SortIndex(self.sidecar_path('sort.db'), sort_fields(object_cls))
+        self.indexes = [self.search_index, self.sort_index]
+        self.summary = StatsSummary(self.sidecar_path('stats.json'))
+        self.ensure_file_exists()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # 手动管理事务, 写入统一使用 BEGIN IMMEDIATE 以便在同一事务中检查版本号
+            self._conn = sqlite3.connect(str(self.file_path), timeout=30, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._create_schema()
+        return self._conn
+
+    def _create_schema(self):
+        types = {f.name: SQL_TYPES.get(f.type, 'TEXT') for f in fields(self.object_cls)}
+        columns = ', '.join(f"{name} {types[name]}" for name in self.columns if name != 'id')
+        with self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS objects "
+                f"(id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+            for column in INDEXED_COLUMNS:
+                if column in self.columns:
+                    self._conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_{column} ON objects ({column})")
+            if 'assignee' in self.columns:
+                # 覆盖 "某负责人未完成的高优先级任务" 这类组合过滤
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_assignee_completed_priority "
+                    "ON objects (assignee, completed, priority)")
+
+    def ensure_file_exists(self):
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn  # 打开连接时建表
+
+    def create_object(self, data: Dict) -> BaseObject:
+        data = {key: data[key] for key in self.columns if key in data}
+        data['completed'] = bool(data.get('completed'))
+        return self.object_cls(**data)
+
+    def _select(self, where: str = '', params: Iterable = ()) -> List[BaseObject]:
+        return list(self._iter_select(where, params))
+
+    def _iter_select(self, where: str = '', params: Iterable = (), suffix: str = '') -> Iterator[BaseObject]:
+        rows = self.conn.execute(f"SELECT * FROM objects {where} ORDER BY id {suffix}", tuple(params))
+        return (self.create_object(dict(row)) for row in rows)
+
+    @profiled('load_objects')
+    def load_objects(self) -> List[BaseObject]:
+        return self._select()
+
+    @profiled('get_objects')
+    def get_objects(self, ids: Iterable[int]) -> List[BaseObject]:
+        ids = list(ids)
+        by_id = {}
+        # 分批查询, 避免超过 SQLite 的参数个数上限
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for obj in self._select(f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+                by_id[obj.id] = obj
+        return [by_id[id_] for id_ in ids if id_ in by_id]
+
+    def version(self) -> int:
+        """每次写入都会递增 PRAGMA user_version"""
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    @contextmanager
+    def _write(self, expected_version: Optional[int] = None):
+        """写事务: 加写锁后检查版本号, 提交前递增版本号"""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = self.version()
+            if expected_version is not None and version != expected_version:
+                raise ConflictError(f"{self.file_path} 已被其他进程修改")
+            yield
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self._version = version + 1
+
+    def _replace(self, objects: List[BaseObject]) -> int:
+        with self._write():
+            self.conn.execute("DELETE FROM objects")
+            self._insert(objects)
+        return self._version
+
+    def _put(self, objects: List[BaseObject], expected_version: Optional[int] = None) -> int:
+        with self._write(expected_version):
+            self._insert(objects)
+        return self._version
+
+    def _insert(self, objects: Iterable[BaseObject]):
+        placeholders = ', '.join('?' * len(self.columns))
+        sql = f"INSERT OR REPLACE INTO objects ({', '.join(self.columns)}) VALUES ({placeholders})"
+        for obj in objects:
+            values = [getattr(obj, name) for name in self.columns]
+            # id 为 0 的新对象由 SQLite 分配 id
+            values[self.columns.index('id')] = obj.id or None
+            obj.id = self.conn.execute(sql, values).lastrowid
+
+    def _delete(self, objects: List[BaseObject], expected_version: Optional[int] = None) -> int:
+        with self._write(expected_version):
+            self.conn.executemany("DELETE FROM objects WHERE id = ?",
+                                  [(obj.id,) for obj in objects])
+        return self._version
+
+    def find_by_title(self, title: str) -> List[BaseObject]:
+        return self._select("WHERE title = ?", [title])
+
+    def find_by_titles(self, titles: Iterable[str]) -> Dict[str, List[BaseObject]]:
+        titles = list(dict.fromkeys(titles))
+        result = {title: [] for title in titles}
+        for start in range(0, len(titles), 500):
+            chunk = titles[start:start + 500]
+            for obj in self._select(f"WHERE title IN ({', '.join('?' * len(chunk))})", chunk):
+                result[obj.title].append(obj)
+        return result
+
+    @profiled('iter_objects', lazy=True)
+    def iter_objects(self, query: Optional[str] = None, offset: int = 0,
+                     limit: Optional[int] = None, **filters) -> Iterator[BaseObject]:
+        conditions, params = [], []
+        for key, value in filters.items():
+            if value is None:
+                continue
+            if key not in self.columns:
+                return iter(())
+            conditions.append(f"{key} = ?")
+            params.append(value)
+        if query:
+            objects = self.search(query, search_limit(offset, limit, filters))
+            if objects is not None:
+                matched = (obj for obj in objects if matches(obj, **filters))
+                return islice(matched, offset, None if limit is None else offset + limit)
+            pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append("(title LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\')")
+            params += [pattern, pattern]
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ''
+        params += [-1 if limit is None else limit, offset]
+        return self._iter_select(where, params, "LIMIT ? OFFSET ?")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def import_json(source: ObjectManager, target: SqliteObjectManager) -> int:
+    """把文件存储中的对象一次性导入 SQLite, 保留原有 id, 返回导入数量"""
+    objects = source.load_objects()
+    target.save_objects(objects)
+    return len(objects)
@@ -0,0 +1,103 @@
+"""统计摘要: 存放在存储文件旁的计数器文件 (如 .jobs.json.stats.json)
+
+按完成状态、优先级、负责人计数, 未完成对象另按截止日期键计数以便统计逾期数量。
+ObjectManager 每次写入时在存储锁内按增量更新计数器, todo stats 只读取这个小文件,
+不需要加载整个存储。摘要记录了对应的存储版本号: 写入前的版本与摘要不一致
+(存储被绕过管理器修改, 或 SQLite 存储的并发写入) 时删除摘要, 下次读取时整体重建。
+"""
+import json
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .sort_index import deadline_key, now_key
+
+STATES = ('open', 'done')
+
+
+def plain(version: Any) -> Any:
+    """版本号转换为 JSON 读回后的形式 (元组变为列表), 以便与摘要中的版本号比较"""
+    return json.loads(json.dumps(version))
+
+
+def object_counts(obj) -> List[str]:
+    """对象计入的计数器键"""
+    state = STATES[bool(obj.completed)]
+    keys = ['total', state]
+    if hasattr(obj, 'priority'):
+        keys.append(f"priority:{state}:{obj.priority}")
+    if hasattr(obj, 'assignee'):
+        keys.append(f"assignee:{state}:{obj.assignee}")
+    if hasattr(obj, 'deadline') and not obj.completed:
+        key = deadline_key(obj.deadline)
+        if key is not None:
+            keys.append(f"deadline:{key}")
+    return keys
+
+
+def count_objects(objects: Iterable) -> Counter:
+    counts = Counter()
+    for obj in objects:
+        counts.update(object_counts(obj))
+    return counts
+
+
+def overdue(counts: Counter, now: Optional[int] = None) -> int:
+    """截止时间早于 now 的未完成对象数"""
+    now = now_key() if now is None else now
+    return sum(count for key, count in counts.items()
+               if key.startswith('deadline:') and int(key[9:]) < now)
+
+
+def breakdown(counts: Counter, field: str) -> Dict[str, Dict[str, int]]:
+    """{字段值: {'open': n, 'done': n}}"""
+    result = {}
+    for key, count in counts.items():
+        if key.startswith(field + ':'):
+            _, state, value = key.split(':', 2)
+            result.setdefault(value, dict.fromkeys(STATES, 0))[state] = count
+    return result
+
+
+class StatsSummary:
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
+
+    def exists(self) -> bool:
+        return self.file_path.exists()
+
+    def load(self) -> Optional[Dict]:
+        """{'version': ..., 'counts': {...}}; 文件不存在或损坏时返回 None"""
+        try:
+            with open(self.file_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, counts: Counter, version: Any):
+        # 计数器可以随时重建, 不需要 fsync
+        tmp_path = self.file_path.with_name(f"{self.file_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': plain(version), 'counts': dict(sorted(counts.items()))}, f,
+                      ensure_ascii=False)
+        os.replace(tmp_path, self.file_path)
+
+    def invalidate(self):
+        try:
+            self.file_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def apply(self, before: Any, version: Any, added: Iterable = (), removed: Iterable = ()):
+        """在版本 before 的摘要上计入一次写入; 摘要尚未建立时跳过, 等首次读取时整体重建"""
+        summary = self.load()
+        if summary is None:
+            return
+        if summary['version'] != plain(before):
+            self.invalidate()
+            return
+        counts = Counter(summary['counts'])
+        counts.update(count_objects(added))
+        counts.subtract(count_objects(removed))
+        self.save(+counts, version)
@@ -0,0 +1,743 @@
+"""存储引擎: 负责对象记录在磁盘上的读写
+
+记录是带有整数 id 字段的字典, id 单调递增且不会复用。
+
+并发控制: 每个存储有一个 <store>.lock 文件, 所有写入都在 fcntl 排他锁内完成,
+文件整体重写时先写临时文件再 os.replace, 中途崩溃不会留下截断的文件。需要
+"读取-修改-写入" 的调用方先通过 version() 取得版本号, 写入时作为
+expected_version 传回, 期间若有其他进程改动了相同的记录则抛出 ConflictError。
+"""
+import fcntl
+import io
+import json
+import mmap
+import os
+import re
+import struct
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from . import codec
+
+# 日志中累计的操作数达到该值后压缩回快照
+COMPACT_THRESHOLD = 1000
+
+READ_CHUNK_SIZE = 64 * 1024
+
+_SEPARATOR_RE = re.compile(r'[\s,]*')
+
+# 快照文件格式, 读取时根据文件头自动识别 (见 codec.py)
+FORMATS = ('json', 'binary')
+
+# id -> 快照偏移量索引的文件格式: 文件头 (魔数, 对应快照的 seq), 之后第 id 个槽位
+# 为该记录在快照中的 (偏移量, 长度), 长度为 0 表示快照中没有这个 id
+OFFSETS_MAGIC = b'TDOF'
+_OFFSETS_HEADER = struct.Struct('<4sQ')
+_OFFSETS_SLOT = struct.Struct('<QI')
+
+
+class StorageError(Exception):
+    """存储文件无法读取或写入"""
+
+
+class ConflictError(StorageError):
+    """读取之后有其他进程修改了相同的记录"""
+
+
+def iter_json_array(f, chunk_size: int = READ_CHUNK_SIZE) -> Iterator:
+    """增量解析 JSON 数组, 每解析出一个元素就产出一个, 不需要读入整个文件
+
+    空文件视为空数组, 其他不完整或损坏的内容抛出 json.JSONDecodeError。
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size).lstrip()
+    if not buf:
+        return
+    if not buf.startswith('['):
+        raise json.JSONDecodeError("Expecting '['", buf, 0)
+    pos = 1
+    while True:
+        pos = _SEPARATOR_RE.match(buf, pos).end()
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # 元素跨越了读取块的边界, 继续读入后重试
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
+
+
+def detect_format(path: Path) -> Optional[str]:
+    """根据文件头判断快照格式, 文件不存在时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            return 'binary' if f.read(len(codec.MAGIC)) == codec.MAGIC else 'json'
+    except FileNotFoundError:
+        return None
+
+
+def iter_snapshot(path: Path) -> Iterator[Dict]:
+    """逐条读取快照, 按文件头选择 JSON 或二进制解码; 文件不存在时视为空"""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        yield from read_snapshot(f, path)
+
+
+def read_snapshot(f, path: Path) -> Iterator[Dict]:
+    """从已打开的快照 (文件或 mmap, 位于开头) 逐条读取记录"""
+    try:
+        if f.read(len(codec.MAGIC)) == codec.MAGIC:
+            yield from codec.iter_snapshot(f)
+        else:
+            f.seek(0)
+            yield from iter_json_array(io.TextIOWrapper(f, encoding='utf-8'))
+    except ValueError as e:
+        raise StorageError(f"存储文件已损坏: {path}: {e}")
+
+
+def encode_snapshot(records: List[Dict], snapshot_format: str) -> Tuple[bytes, Dict[int, Tuple[int, int]]]:
+    """编码快照, 同时返回每条记录的 (偏移量, 长度); JSON 格式为每行一条记录的数组"""
+    if snapshot_format == 'binary':
+        return codec.encode_snapshot(records)
+    rows = [json.dumps(r, ensure_ascii=False).encode('utf-8') for r in records]
+    offsets, pos = {}, 2
+    for record, row in zip(records, rows):
+        offsets[record['id']] = (pos, len(row))
+        pos += len(row) + 2
+    return (b"[\n" + b",\n".join(rows) + b"\n]\n" if rows else b"[]\n"), offsets
+
+
+def assign_ids(records: List[Dict], next_id: int = 1) -> int:
+    """为缺少 id 的记录按顺序分配 id, 返回下一个可用 id"""
+    next_id = max([next_id] + [r['id'] + 1 for r in records if r.get('id')])
+    for record in records:
+        if not record.get('id'):
+            record['id'] = next_id
+            next_id += 1
+    return next_id
+
+
+def write_atomic(path: Path, data: Union[str, bytes]):
+    """先写临时文件并 fsync, 再原子地替换目标文件"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _op_ids(op: Dict) -> List[int]:
+    """日志操作涉及的记录 id"""
+    if op['op'] == 'put':
+        return [op['obj']['id']]
+    if op['op'] == 'mark':
+        return op['ids']
+    return [op['id']]
+
+
+class Storage(ABC):
+    """存储引擎接口"""
+
+    def __init__(self, file_path: Path, snapshot_format: Optional[str] = None):
+        if snapshot_format not in (None,) + FORMATS:
+            raise StorageError(f"未知的存储格式: {snapshot_format}")
+        self.file_path = file_path
+        # 写入快照时使用的格式; 为 None 时沿用现有快照的格式
+        self.snapshot_format = snapshot_format
+        self.lock_path = file_path.with_name(file_path.name + '.lock')
+        # json 引擎记录下一个可用 id 的附属文件, 删除末尾的记录后 id 也不会被复用
+        self.next_id_path = file_path.with_name(file_path.name + '.next_id')
+        self._lock_file = None
+        self._lock_depth = 0
+
+    def exists(self) -> bool:
+        return self.file_path.exists()
+
+    def stored_next_id(self) -> int:
+        """<store>.next_id 中记录的下一个可用 id, 文件不存在时为 1"""
+        try:
+            return int(self.next_id_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return 1
+
+    def target_format(self) -> str:
+        return self.snapshot_format or detect_format(self.file_path) or 'json'
+
+    @contextmanager
+    def lock(self):
+        """持有存储的排他锁 (可重入)"""
+        if self._lock_depth == 0:
+            self._lock_file = open(self.lock_path, 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                self._lock_file.close()
+                self._lock_file = None
+
+    @abstractmethod
+    def load(self) -> List[Dict]:
+        """读取全部记录"""
+
+    def iter_records(self) -> Iterator[Dict]:
+        """逐条产出记录"""
+        return iter(self.load())
+
+    def get(self, ids: Iterable[int]) -> List[Dict]:
+        """按 id 读取记录, 结果保持 ids 的顺序, 不存在的 id 被忽略"""
+        ids = list(ids)
+        wanted = set(ids)
+        by_id = {r['id']: r for r in self.iter_records() if r['id'] in wanted}
+        return [by_id[id_] for id_ in ids if id_ in by_id]
+
+    @abstractmethod
+    def version(self) -> Any:
+        """当前版本号, 只用于和之后的版本号比较是否相等"""
+
+    @abstractmethod
+    def replace(self, records: List[Dict]) -> Any:
+        """用给定记录整体替换存储内容, 返回新的版本号"""
+
+    @abstractmethod
+    def apply(self, puts: Iterable[Dict] = (), deletes: Iterable[int] = (),
+              expected_version: Any = None) -> Any:
+        """批量写入 (新增或覆盖) 和删除记录, 缺少 id 的记录会被分配新 id
+
+        给出 expected_version 时, 若此后相关记录被其他进程修改过则抛出 ConflictError。
+        返回写入后的版本号。
+        """
+
+
+class JsonStorage(Storage):
+    """原有格式: 整个文件是带缩进的 JSON 数组, 每次修改都整体重写
+
+    选择二进制格式时整个文件改为二进制快照。版本号取自文件的 inode 和修改时间,
+    冲突检测的粒度是整个文件。下一个可用 id 在每次写入时先于文件写入
+    <store>.next_id, 中途崩溃最多跳过一些 id 而不会复用。从 journal/mmap 引擎
+    切换过来时, 先把留下的日志 (连同其中的 next_id) 合并进文件并删除日志。
+    """
+
+    def __init__(self, file_path: Path, snapshot_format: Optional[str] = None):
+        super().__init__(file_path, snapshot_format)
+        self.journal_path = file_path.with_name(file_path.name + '.journal')
+
+    def load(self) -> List[Dict]:
+        self._fold_journal()
+        if detect_format(self.file_path) == 'binary':
+            records = list(iter_snapshot(self.file_path))
+            assign_ids(records, self.stored_next_id())
+            return records
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            return []
+        except json.JSONDecodeError as e:
+            raise StorageError(f"存储文件已损坏: {self.file_path}: {e}")
+        assign_ids(records, self.stored_next_id())
+        return records
+
+    def version(self) -> Optional[Tuple[int, int, int]]:
+        self._fold_journal()
+        try:
+            st = self.file_path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def replace(self, records: List[Dict]):
+        with self.lock():
+            return self._write(records, assign_ids(records, self.stored_next_id()))
+
+    def _write(self, records: List[Dict], next_id: int):
+        """在持有锁时写入全部记录 (均已有 id) 和下一个可用 id"""
+        with self.lock():
+            write_atomic(self.next_id_path, str(next_id))
+            if self.target_format() == 'binary':
+                write_atomic(self.file_path, codec.encode_snapshot(records)[0])
+            else:
+                write_atomic(self.file_path, json.dumps(records, ensure_ascii=False, indent=4))
+            # 文件已包含全部记录, 其他引擎留下的日志和偏移量索引不再有效
+            for path in (self.journal_path, self.file_path.with_name(self.file_path.name + '.offsets')):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            return self.version()
+
+    def _fold_journal(self):
+        """存在日志时把它合并进文件; 否则日志中的修改会被忽略, 切换回日志引擎时又会覆盖此后的修改"""
+        if not self.journal_path.exists():
+            return
+        with self.lock():
+            if self.journal_path.exists():
+                journal = JournalStorage(self.file_path)
+                records = journal.load()
+                self._write(records, assign_ids(records, journal.next_id()))
+
+    def apply(self, puts: Iterable[Dict] = (), deletes: Iterable[int] = (),
+              expected_version: Any = None):
+        with self.lock():
+            if expected_version is not None and expected_version != self.version():
+                raise ConflictError(f"{self.file_path} 已被其他进程修改")
+            records = self.load()
+            next_id = assign_ids(records, self.stored_next_id())
+            by_id = {r['id']: r for r in records}
+            for record in puts:
+                if not record.get('id'):
+                    record['id'] = next_id
+                next_id = max(next_id, record['id'] + 1)
+                by_id[record['id']] = record
+            for id_ in deletes:
+                by_id.pop(id_, None)
+            return self._write(list(by_id.values()), next_id)
+
+
+class JournalStorage(Storage):
+    """快照 + 追加日志
+
+    快照为 JSON 数组 (每行一条记录) 或二进制格式, 旧版的带缩进文件会在首次
+    访问时自动迁移。日志文件每行一个操作::
+
+        {"op": "put", "obj": {...}, "next_id": 3, "seq": 7, "n": 1}
+        {"op": "del", "id": 2, "next_id": 3, "seq": 8, "n": 2}
+
+    每行都带有 next_id、全局序号 seq (即版本号, 压缩后继续递增) 和自上次压缩
+    以来的操作数 n, 因此追加时只需读取日志最后一行, 单次修改的 I/O 与存储规模
+    无关。重放是幂等的, 压缩时即使在替换快照和清空日志之间中断也不会丢失数据;
+    读取不加锁, 总能看到某个一致的状态。
+
+    写快照时同时写出 <store>.offsets (id -> 快照中的偏移量), 按 id 读取时只需
+    读日志和目标记录所在的那一行, 不必扫描快照。
+    """
+
+    def __init__(self, file_path: Path, snapshot_format: Optional[str] = None,
+                 compact_threshold: int = COMPACT_THRESHOLD):
+        super().__init__(file_path, snapshot_format)
+        self.journal_path = file_path.with_name(file_path.name + '.journal')
+        self.offsets_path = file_path.with_name(file_path.name + '.offsets')
+        self.compact_threshold = compact_threshold
+        # 已解析的日志: (inode, 首行, 已读到的偏移量, 写入的记录, 删除的 id, 快照的 seq, id -> 最后修改的 seq)
+        self._overlay = None
+
+    def exists(self) -> bool:
+        return self.file_path.exists() or self.journal_path.exists()
+
+    def load(self) -> List[Dict]:
+        return list(self.iter_records())
+
+    def iter_records(self) -> Iterator[Dict]:
+        """先读入日志 (其长度受压缩阈值限制), 再流式读取快照并叠加日志中的修改"""
+        self._ensure_journal()
+        puts, deleted, _ = self._read_overlay()
+        puts = dict(puts)
+        for record in self._iter_snapshot():
+            if record['id'] not in deleted:
+                yield puts.pop(record['id'], record)
+        yield from puts.values()
+
+    def get(self, ids: Iterable[int]) -> List[Dict]:
+        """日志中没有的记录通过偏移量索引直接从快照中读取"""
+        self._ensure_journal()
+        ids = list(ids)
+        puts, deleted, base_seq = self._read_overlay()
+        by_id = {id_: puts[id_] for id_ in ids if id_ in puts}
+        missing = [id_ for id_ in ids if id_ not in puts and id_ not in deleted]
+        if missing:
+            records = self._read_snapshot_records(missing, base_seq)
+            if records is None:
+                # 偏移量索引不可用 (旧格式的快照, 或读取期间快照被替换)
+                return super().get(ids)
+            by_id.update(records)
+        return [by_id[id_] for id_ in ids if id_ in by_id]
+
+    def version(self) -> int:
+        self._ensure_journal()
+        return self._tail()[1]
+
+    def next_id(self) -> int:
+        """下一个可用 id"""
+        self._ensure_journal()
+        return self._tail()[0]
+
+    def replace(self, records: List[Dict]) -> int:
+        with self.lock():
+            # 从 json 引擎切换过来时沿用其记录的下一个可用 id
+            next_id, seq = self.stored_next_id(), 0
+            if self.journal_path.exists():
+                next_id, seq = self._tail()[:2]
+            next_id = assign_ids(records, next_id)
+            data, offsets = encode_snapshot(records, self.target_format())
+            write_atomic(self.file_path, data)
+            self._write_offsets(offsets, seq + 1)
+            self._write_journal_header(next_id, seq + 1)
+            return seq + 1
+
+    def apply(self, puts: Iterable[Dict] = (), deletes: Iterable[int] = (),
+              expected_version: Optional[int] = None) -> int:
+        puts, deletes = list(puts), list(deletes)
+        self._ensure_journal()
+        with self.lock():
+            self._check_conflict(expected_version, puts, deletes)
+            next_id = self._tail()[0]
+            ops = []
+            for record in puts:
+                if not record.get('id'):
+                    record['id'] = next_id
+                next_id = max(next_id, record['id'] + 1)
+                ops.append({'op': 'put', 'obj': record})
+            for id_ in deletes:
+                ops.append({'op': 'del', 'id': id_})
+            return self._append(ops, next_id)
+
+    def _check_conflict(self, expected_version: Optional[int], puts: List[Dict], deletes: List[int]):
+        if expected_version is None or expected_version == self._tail()[1]:
+            return
+        ids = {r['id'] for r in puts if r.get('id')} | set(deletes)
+        if self._changed_since(expected_version, ids):
+            raise ConflictError(f"{self.file_path} 中的记录已被其他进程修改")
+
+    def _append(self, ops: List[Dict], next_id: int) -> int:
+        """在持有锁时把操作追加到日志末尾, 返回新的 seq; 累计操作数达到阈值时压缩"""
+        _, seq, count, needs_newline = self._tail()
+        if not ops:
+            return seq
+        lines = ['\n'] if needs_newline else []
+        for op in ops:
+            seq += 1
+            count += 1
+            op.update(next_id=next_id, seq=seq, n=count)
+            lines.append(json.dumps(op, ensure_ascii=False) + '\n')
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        if count >= self.compact_threshold:
+            seq = self.compact()
+        return seq
+
+    def compact(self) -> int:
+        """把日志合并进快照并清空日志"""
+        with self.lock():
+            return self.replace(self.load())
+
+    def _changed_since(self, version: int, ids: Set[int]) -> bool:
+        """日志中版本号大于 version 的操作是否涉及 ids; 期间发生过压缩时保守地返回 True"""
+        state = self._read_journal_state()
+        changed = state[6]
+        return state[5] > version or any(changed.get(id_, 0) > version for id_ in ids)
+
+    def _ensure_journal(self):
+        if self.journal_path.exists():
+            return
+        with self.lock():
+            if not self.journal_path.exists():
+                self.replace(list(self._iter_snapshot()))
+
+    def _iter_snapshot(self) -> Iterator[Dict]:
+        try:
+            f = self._open(self.file_path)
+        except FileNotFoundError:
+            return
+        with f:
+            yield from read_snapshot(f, self.file_path)
+
+    def _open(self, path: Path):
+        """打开快照或偏移量索引用于读取, 返回的对象支持 read/seek"""
+        return open(path, 'rb')
+
+    def _read_overlay(self) -> Tuple[Dict[int, Dict], Set[int], int]:
+        """读取日志, 返回 (日志中写入的记录, 日志中删除的 id, 快照对应的 seq); 调用者不能修改返回的容器"""
+        return self._read_journal_state()[3:6]
+
+    def _read_journal_state(self) -> Tuple:
+        """增量解析日志
+
+        日志在两次压缩之间只在末尾追加, 压缩时整体替换 (inode 和带 seq 的首行都会改变),
+        因此只需解析上次读到的位置之后新增的完整行。写入时在锁内读取已有状态不再随日志
+        变长而变慢。
+        """
+        with open(self.journal_path, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            header = f.readline()
+            state = self._overlay
+            if state is None or state[:2] != (inode, header) or f.seek(0, os.SEEK_END) < state[2]:
+                state = (inode, header, 0, {}, set(), 0, {})
+            _, _, offset, puts, deleted, base_seq, changed = state
+            f.seek(offset)
+            data = f.read()
+        # 末尾不完整的行 (正在写入或写入中断) 留到下次读取
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                op = json.loads(line)
+            except ValueError:
+                # 写入中断留下的残行
+                continue
+            if op['op'] == 'base':
+                base_seq = op.get('seq', 0)
+                continue
+            if op['op'] == 'put':
+                puts[op['obj']['id']] = op['obj']
+                deleted.discard(op['obj']['id'])
+            elif op['op'] == 'del':
+                puts.pop(op['id'], None)
+                deleted.add(op['id'])
+            for id_ in _op_ids(op):
+                changed[id_] = op.get('seq', 0)
+        self._overlay = state = (inode, header, offset + end, puts, deleted, base_seq, changed)
+        return state
+
+    def _open_offsets(self, base_seq: int, rebuild: bool = True):
+        """打开与当前快照对应的偏移量索引; 索引缺失或过期 (如旧版本写出的快照) 时重建一次"""
+        try:
+            offsets = self._open(self.offsets_path)
+        except FileNotFoundError:
+            offsets = None
+        if offsets is not None:
+            if self._offsets_seq(offsets) == base_seq:
+                return offsets
+            offsets.close()
+        if not rebuild or not self._rebuild_offsets():
+            return None
+        return self._open_offsets(self._read_overlay()[2], rebuild=False)
+
+    @staticmethod
+    def _slot(offsets, id_: int) -> Optional[Tuple[int, int]]:
+        """id 在快照中的 (偏移量, 长度), 快照中没有该 id 时返回 None"""
+        offsets.seek(_OFFSETS_HEADER.size + id_ * _OFFSETS_SLOT.size)
+        slot = offsets.read(_OFFSETS_SLOT.size)
+        if len(slot) < _OFFSETS_SLOT.size:
+            return None
+        pos, length = _OFFSETS_SLOT.unpack(slot)
+        return (pos, length) if length else None
+
+    def _read_snapshot_records(self, ids: List[int], base_seq: int) -> Optional[Dict[int, Dict]]:
+        """通过偏移量索引读取快照中的记录; 索引不可用时返回 None"""
+        offsets = self._open_offsets(base_seq)
+        if offsets is None:
+            return None
+        records = {}
+        with offsets, self._open(self.file_path) as snapshot:
+            decode = json.loads
+            if snapshot.read(len(codec.MAGIC)) == codec.MAGIC:
+                try:
+                    decode = codec.BinaryCodec.read_header(snapshot).decode
+                except ValueError:
+                    return None
+            for id_ in ids:
+                slot = self._slot(offsets, id_)
+                if slot is None:
+                    continue
+                snapshot.seek(slot[0])
+                try:
+                    record = decode(snapshot.read(slot[1]))
+                except (ValueError, IndexError, struct.error):
+                    return None
+                if record.get('id') != id_:
+                    # 读取期间快照被替换
+                    return None
+                records[id_] = record
+        return records
+
+    @staticmethod
+    def _offsets_seq(f) -> Optional[int]:
+        header = f.read(_OFFSETS_HEADER.size)
+        if len(header) < _OFFSETS_HEADER.size:
+            return None
+        magic, seq = _OFFSETS_HEADER.unpack(header)
+        return seq if magic == OFFSETS_MAGIC else None
+
+    def _write_offsets(self, offsets: Dict[int, Tuple[int, int]], seq: int):
+        data = bytearray(_OFFSETS_HEADER.size + _OFFSETS_SLOT.size * (max(offsets, default=0) + 1))
+        _OFFSETS_HEADER.pack_into(data, 0, OFFSETS_MAGIC, seq)
+        for id_, (pos, length) in offsets.items():
+            _OFFSETS_SLOT.pack_into(data, _OFFSETS_HEADER.size + id_ * _OFFSETS_SLOT.size, pos, length)
+        write_atomic(self.offsets_path, bytes(data))
+
+    def _rebuild_offsets(self) -> bool:
+        """扫描快照重建偏移量索引; 快照无法建立索引 (如旧版带缩进的 JSON) 时返回 False"""
+        with self.lock():
+            try:
+                with open(self.file_path, 'rb') as f:
+                    if f.read(len(codec.MAGIC)) == codec.MAGIC:
+                        offsets = {record['id']: (pos, length)
+                                   for pos, length, record in codec.iter_offsets(f)}
+                    else:
+                        f.seek(0)
+                        offsets = self._scan_json_offsets(f)
+            except FileNotFoundError:
+                offsets = {}
+            except (ValueError, KeyError):
+                return False
+            if offsets is None:
+                return False
+            self._write_offsets(offsets, self._read_overlay()[2])
+        return True
+
+    @staticmethod
+    def _scan_json_offsets(f) -> Optional[Dict[int, Tuple[int, int]]]:
+        offsets, pos = {}, 0
+        for line in f:
+            row = line.rstrip(b'\r\n')
+            if row.endswith(b','):
+                row = row[:-1]
+            if row.startswith(b'{'):
+                offsets[json.loads(row)['id']] = (pos, len(row))
+            elif row not in (b'[', b']', b'[]', b''):
+                return None
+            pos += len(line)
+        return offsets
+
+    def _read_journal(self) -> Iterable[Dict]:
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # 写入中断留下的残行
+                    continue
+
+    def _write_journal_header(self, next_id: int, seq: int):
+        header = {'op': 'base', 'next_id': next_id, 'seq': seq, 'n': 0}
+        write_atomic(self.journal_path, json.dumps(header) + '\n')
+
+    def _tail(self) -> Tuple[int, int, int, bool]:
+        """返回 (next_id, seq, 操作数, 末尾是否缺少换行)"""
+        with open(self.journal_path, 'rb') as f:
+            end = f.seek(0, os.SEEK_END)
+            pos, chunk = end, b''
+            while pos > 0 and chunk.count(b'\n') < 2:
+                step = min(4096, pos)
+                pos -= step
+                f.seek(pos)
+                chunk = f.read(step) + chunk
+        needs_newline = bool(chunk) and not chunk.endswith(b'\n')
+        try:
+            last = json.loads(chunk.rstrip(b'\n').rsplit(b'\n', 1)[-1])
+            return last['next_id'], last.get('seq', 0), last['n'], needs_newline
+        except (ValueError, KeyError):
+            pass
+        # 最后一行不完整时退回到完整扫描
+        next_id, seq, count = 1, 0, 0
+        for op in self._read_journal():
+            next_id, seq, count = op.get('next_id', next_id), op.get('seq', seq), op.get('n', count)
+        if count == 0 and next_id == 1:
+            next_id = assign_ids(list(self._iter_snapshot()))
+        return next_id, seq, count, needs_newline
+
+
+class MmapStorage(JournalStorage):
+    """内存映射的二进制快照 + 追加日志
+
+    快照固定使用二进制格式, 记录的定长部分布局固定, 配合偏移量索引即可定位任意
+    记录及其中的字段。读取通过 mmap 进行, 只访问实际读到的记录所在的页, 因此
+    list --limit、按 id 读取的耗时与存储总大小无关。
+
+    只修改了 completed 的记录直接改写快照中对应的一个字节, 每次写入只在日志中
+    追加一行不含数据的 mark 操作 (列出改动的 id) 用于递增版本号和冲突检测, 重放时
+    忽略; 其他修改照常追加到日志。
+    """
+
+    def __init__(self, file_path: Path, snapshot_format: Optional[str] = None,
+                 compact_threshold: int = COMPACT_THRESHOLD):
+        super().__init__(file_path, 'binary', compact_threshold)
+        self._converting = False
+
+    def _ensure_journal(self):
+        super()._ensure_journal()
+        if not self._converting and detect_format(self.file_path) == 'json':
+            # 从其他引擎切换过来的 JSON 快照, 先转换为二进制
+            with self.lock():
+                self._converting = True
+                try:
+                    if detect_format(self.file_path) == 'json':
+                        self.compact()
+                finally:
+                    self._converting = False
+
+    def _open(self, path: Path):
+        f = open(path, 'rb')
+        with f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件无法映射
+                return open(path, 'rb')
+        if path == self.file_path and mapped[:len(codec.MAGIC)] != codec.MAGIC:
+            # 尚未转换的 JSON 快照需要按文本流式解析
+            mapped.close()
+            return open(path, 'rb')
+        return mapped
+
+    def apply(self, puts: Iterable[Dict] = (), deletes: Iterable[int] = (),
+              expected_version: Optional[int] = None) -> int:
+        puts, deletes = list(puts), list(deletes)
+        self._ensure_journal()
+        with self.lock():
+            self._check_conflict(expected_version, puts, deletes)
+            puts, flipped = self._flip_completed(puts)
+            if flipped:
+                self._append([{'op': 'mark', 'ids': flipped}], self._tail()[0])
+            return super().apply(puts, deletes)
+
+    def _flip_completed(self, puts: List[Dict]) -> Tuple[List[Dict], List[int]]:
+        """在持有锁时把只改变了 completed 的记录写回快照, 返回 (其余记录, 已原地修改的 id)"""
+        journal_puts, deleted, base_seq = self._read_overlay()
+        candidates = [r for r in puts if r.get('id') and isinstance(r.get('completed'), bool)
+                      and r['id'] not in journal_puts and r['id'] not in deleted]
+        if not candidates:
+            return puts, []
+        offsets = self._open_offsets(base_seq)
+        if offsets is None:
+            return puts, []
+        flipped = set()
+        with offsets, open(self.file_path, 'r+b') as f:
+            if f.read(len(codec.MAGIC)) != codec.MAGIC:
+                return puts, []
+            snapshot_codec = codec.BinaryCodec.read_header(f)
+            position = snapshot_codec.field_position('completed')
+            if position is None:
+                return puts, []
+            with mmap.mmap(f.fileno(), 0) as mapped:
+                for record in candidates:
+                    slot = self._slot(offsets, record['id'])
+                    if slot is None:
+                        continue
+                    pos, length = slot
+                    body = mapped[pos:pos + length]
+                    if body[0] != codec.PACKED:
+                        continue
+                    current = snapshot_codec.decode(body)
+                    if dict(current, completed=record['completed']) != record:
+                        continue
+                    mapped[pos + position] = int(record['completed'])
+                    flipped.add(record['id'])
+                if flipped:
+                    mapped.flush()
+        return [r for r in puts if r.get('id') not in flipped], sorted(flipped)
+
+
+STORAGES = {
+    'json': JsonStorage,
+    'journal': JournalStorage,
+    'mmap': MmapStorage,
+}
@@ -0,0 +1,69 @@
+"""标题索引: 存放在存储文件旁的 标题 -> id 二级索引
+
+complete/delete 按标题查找时先查此索引, 再按 id 读取对象, 不需要扫描整个存储。
+索引在创建/修改/删除对象时增量更新, 文件不存在时会在首次查找时整体重建;
+查到的对象会再核对一次标题, 因此索引偶尔滞后也不会返回错误的对象。
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+class TitleIndex:
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
+        self._conn = None
+
+    def exists(self) -> bool:
+        return self._conn is not None or self.file_path.exists()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            import sqlite3
+            self._conn = sqlite3.connect(str(self.file_path))
+            with self._conn:
+                self._conn.execute("CREATE TABLE IF NOT EXISTS titles (id INTEGER PRIMARY KEY, title TEXT)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS titles_title ON titles (title)")
+        return self._conn
+
+    def put(self, objects: Iterable):
+        """写入或更新对象的标题; 索引尚未建立时跳过, 等首次查找时整体重建"""
+        if not self.exists():
+            return
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO titles VALUES (?, ?)",
+                                  [(obj.id, obj.title) for obj in objects])
+
+    def delete(self, objects: Iterable):
+        if not self.exists():
+            return
+        with self.conn:
+            self.conn.executemany("DELETE FROM titles WHERE id = ?", [(obj.id,) for obj in objects])
+
+    def rebuild(self, objects: Iterable):
+        with self.conn:
+            self.conn.execute("DELETE FROM titles")
+            self.conn.executemany("INSERT OR REPLACE INTO titles VALUES (?, ?)",
+                                  ((obj.id, obj.title) for obj in objects))
+
+    def lookup(self, title: str) -> List[int]:
+        """返回标题完全相同的对象 id, 按 id 排序"""
+        return self.lookup_many([title])[title]
+
+    def lookup_many(self, titles: Iterable[str]) -> Dict[str, List[int]]:
+        titles = list(dict.fromkeys(titles))
+        result = {title: [] for title in titles}
+        # 分批查询, 避免超过 SQLite 的参数个数上限
+        for start in range(0, len(titles), 500):
+            chunk = titles[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT title, id FROM titles WHERE title IN ({', '.join('?' * len(chunk))}) ORDER BY id",
+                chunk)
+            for title, id_ in rows:
+                result[title].append(id_)
+        return result
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
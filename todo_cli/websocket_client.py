@@ -1,23 +1,170 @@
 import asyncio
+import codecs
+import fcntl
+import os
+import signal
+import time
 import websockets
 import sys
 import termios
 import tty
-import select
 import json
 import shutil
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Optional
+
+from .profiling import PROFILER
+
+# 标准输入合并发送: 读到数据后最多再等待 STDIN_FLUSH_INTERVAL 秒收集后续输入,
+# 或攒满 STDIN_MAX_FRAME 字节, 合并为一条 stdin 消息; 单个按键只增加不到几毫秒的延迟,
+# 粘贴的大段文本则按大帧发送, 而不是每个字符一条消息。
+# 终端输入输出都由事件循环驱动 (stdin 用 add_reader, 窗口大小用 SIGWINCH), 空闲时不轮询
+STDIN_FLUSH_INTERVAL = 0.002
+STDIN_MAX_FRAME = 64 * 1024
+
+# 二进制通道协议 (与 kubectl exec 的 v4.channel.k8s.io 相同): 通过 WebSocket 子协议协商,
+# 每条二进制消息首字节为通道号, 其后是原始字节, 不做 JSON 和文本编解码;
+# 服务器未选择该子协议时退回 JSON 消息协议
+CHANNEL_PROTOCOL = 'v4.channel.k8s.io'
+STDIN, STDOUT, STDERR, ERROR, RESIZE = range(5)
+
+PROTOCOLS = ('auto', 'channel', 'json')
+
+# 终端输出: 先放入有界缓冲区, 由事件循环以非阻塞方式写出, 每秒最多 FRAME_RATE 次
+# (攒够 FRAME_BYTES 字节时不必等到下一帧); 缓冲区超过 OUTPUT_LIMIT 字节时暂停接收 (背压),
+# 或在丢弃模式下丢弃新的输出
+FRAME_RATE = 60
+FRAME_BYTES = 64 * 1024
+OUTPUT_LIMIT = 1024 * 1024
+
+# 心跳: 每 PING_INTERVAL 秒 ping 一次, PING_TIMEOUT 秒内没有收到 pong 时断开连接。
+# 交互会话自己发送心跳: 输出积压时 pong 排在未读的数据之后, 只要仍在收到消息
+# 或正因终端跟不上而暂停接收, 就不算超时
+PING_INTERVAL = 30
+PING_TIMEOUT = 10
+
+
+class TerminalWriter:
+    """以非阻塞方式把输出写到一个文件描述符, 终端跟不上时不阻塞事件循环
+
+    距上次写出不足一帧时推迟到下一帧, 一帧内到达的输出合并为一次写入; 积压较多时
+    立即写出, 终端暂时不可写时在可写后继续。
+    drop 为 True 时缓冲区满后新的输出被丢弃, 缓冲区写空后输出一行丢弃字节数的摘要。
+    """
+
+    def __init__(self, fd, limit=OUTPUT_LIMIT, drop=False):
+        self.fd = fd
+        self.limit = limit
+        self.drop = drop
+        self.dropped = 0
+        self._buffer = bytearray()
+        self._loop = asyncio.get_running_loop()
+        self._timer = None
+        self._watching = False
+        self._last_write = 0.0
+        self._space = asyncio.Event()
+        self._space.set()
+        self._flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, self._flags | os.O_NONBLOCK)
+
+    def write(self, data):
+        if self.drop and len(self._buffer) >= self.limit:
+            self.dropped += len(data)
+            return
+        self._buffer += data
+        if not self.drop and len(self._buffer) >= self.limit:
+            self._space.clear()
+        if self._watching:
+            return
+        if len(self._buffer) >= FRAME_BYTES:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._flush()
+        elif self._timer is None:
+            self._schedule()
+
+    async def wait(self):
+        """缓冲区已满时等待终端写出一部分 (背压)"""
+        await self._space.wait()
+
+    @property
+    def backlogged(self):
+        return not self._space.is_set()
+
+    def _schedule(self):
+        delay = self._last_write + 1 / FRAME_RATE - self._loop.time()
+        self._timer = self._loop.call_later(max(delay, 0), self._flush)
+
+    def _flush(self):
+        self._timer = None
+        self._last_write = self._loop.time()
+        try:
+            while self._buffer:
+                written = os.write(self.fd, self._buffer)
+                del self._buffer[:written]
+        except BlockingIOError:
+            pass
+        if not self._buffer and self.dropped:
+            self._buffer += f"\r\n[终端输出跟不上, 已丢弃 {self.dropped} 字节]\r\n".encode()
+            self.dropped = 0
+            self._schedule()
+        if len(self._buffer) < self.limit:
+            self._space.set()
+        # 终端暂时不可写: 等到可写时立即继续写出积压的输出
+        if self._buffer and self._timer is None and not self._watching:
+            self._loop.add_writer(self.fd, self._flush)
+            self._watching = True
+        elif self._watching and (not self._buffer or self._timer is not None):
+            self._loop.remove_writer(self.fd)
+            self._watching = False
+
+    def close(self):
+        """以阻塞方式写出剩余输出并恢复文件描述符的状态"""
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._watching:
+            self._loop.remove_writer(self.fd)
+        fcntl.fcntl(self.fd, fcntl.F_SETFL, self._flags)
+        if self._buffer:
+            try:
+                os.write(self.fd, self._buffer)
+            except OSError:
+                pass
+        self._buffer.clear()
+        self._space.set()
+
 
 class WebSocketShell:
-    def __init__(self, url):
+    interactive = True
+
+    def __init__(self, url, protocol='auto', compression=True, drop_output=False):
+        """protocol 为 auto 时优先协商二进制通道协议; compression 控制是否启用 permessage-deflate;
+        drop_output 为 True 时终端跟不上的输出被丢弃, 否则暂停接收"""
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"未知协议: {protocol}")
         self.url = url
+        self.protocol = protocol
+        self.compression = compression
+        self.drop_output = drop_output
+        self.channel = False
         self.websocket = None
         self.original_settings = None
         self.command_buffer = ""
         self.terminal_size = shutil.get_terminal_size()
         self.is_connected = False
+        self._stdin_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._stdin_buffer = bytearray()
+        self._stdin_flush = None
+        self._outgoing = None
+        self._done = None
+        self._writers = {}
+        self._received = 0
 
     def _set_raw_mode(self):
         """设置终端为raw模式，用于实时读取键盘输入"""
+        if not sys.stdin.isatty():
+            return
         self.original_settings = termios.tcgetattr(sys.stdin)
         tty.setraw(sys.stdin)
 
@@ -28,6 +175,15 @@ class WebSocketShell:
 
     async def _send_message(self, operation, data=None, **kwargs):
         """发送格式化的WebSocket消息"""
+        if self.channel:
+            if operation == "stdin":
+                await self.websocket.send(bytes([STDIN]) + (data.encode() if isinstance(data, str) else data))
+            elif operation == "resize":
+                await self.websocket.send(bytes([RESIZE]) + json.dumps(
+                    {"Width": kwargs["cols"], "Height": kwargs["rows"]}).encode())
+            return
+        if isinstance(data, bytes):
+            data = data.decode()
         message = {
             "operation": operation,
             "data": data,
@@ -35,85 +191,157 @@ class WebSocketShell:
         }
         await self.websocket.send(json.dumps(message))
 
-    async def _read_input(self):
-        """从终端读取输入"""
-        buffer = ""
-        last_ch = None
-        
+    def _on_stdin(self):
+        """stdin 可读时由事件循环调用: 读出当前可用的输入放入缓冲区, 按时间或大小窗口提交"""
+        try:
+            data = os.read(sys.stdin.fileno(), STDIN_MAX_FRAME)
+        except BlockingIOError:
+            return
+        if not data:
+            self._finish()
+            return
+        # 处理退出命令: Ctrl+C 或 Ctrl+D 之前的输入照常发送
+        exit_at = min((i for i in (data.find(b'\x03'), data.find(b'\x04')) if i >= 0), default=-1)
+        self._stdin_buffer += data if exit_at < 0 else data[:exit_at]
+        if exit_at >= 0:
+            self._flush_stdin()
+            self._finish()
+        elif len(self._stdin_buffer) >= STDIN_MAX_FRAME:
+            self._flush_stdin()
+        elif self._stdin_flush is None:
+            self._stdin_flush = asyncio.get_running_loop().call_later(STDIN_FLUSH_INTERVAL,
+                                                                      self._flush_stdin)
+
+    def _flush_stdin(self):
+        """把缓冲区中的输入作为一批交给发送任务; 多字节字符被拆到两批时留到下一批再发送"""
+        if self._stdin_flush is not None:
+            self._stdin_flush.cancel()
+            self._stdin_flush = None
+        if self.channel:
+            data = bytes(self._stdin_buffer)
+        else:
+            data = self._stdin_decoder.decode(bytes(self._stdin_buffer))
+        self._stdin_buffer.clear()
+        if data:
+            self._outgoing.put_nowait(("stdin", {"data": data}))
+
+    def _on_resize(self):
+        """SIGWINCH 处理: 终端大小变化时发送 resize"""
+        new_size = shutil.get_terminal_size()
+        if new_size != self.terminal_size:
+            self.terminal_size = new_size
+            self._outgoing.put_nowait(("resize", {"cols": new_size.columns, "rows": new_size.lines}))
+
+    def _finish(self):
+        if self._done is not None and not self._done.done():
+            self._done.set_result(None)
+
+    async def _send_outgoing(self):
+        """按顺序发送输入和 resize 消息; 发送期间到达的输入会在缓冲区中合并"""
+        try:
+            while True:
+                operation, kwargs = await self._outgoing.get()
+                await self._send_message(operation, **kwargs)
+                self._outgoing.task_done()
+        except websockets.exceptions.ConnectionClosed:
+            self.is_connected = False
+            self._finish()
+
+    def _write_stdout(self, data, stream=None):
+        """把输出 (字节直接写入, 不解码) 交给对应的 TerminalWriter"""
+        self._writers[stream or sys.stdout].write(data if isinstance(data, bytes) else data.encode())
+
+    async def _output_ready(self):
+        """终端输出积压时等待, 在此期间不再读取新消息"""
+        for writer in self._writers.values():
+            await writer.wait()
+
+    def _handle_channel_message(self, message):
+        """处理二进制通道协议的消息"""
+        if isinstance(message, str):
+            message = message.encode()
+        if not message:
+            return
+        channel, payload = message[0], message[1:]
+        if channel == STDOUT:
+            self._write_stdout(payload)
+        elif channel == STDERR:
+            self._write_stdout(payload, sys.stderr)
+        elif channel == ERROR:
+            # 错误通道为 Status 对象, 命令成功结束时 status 为 Success
+            try:
+                status = json.loads(payload)
+            except ValueError:
+                status = {"message": payload.decode(errors='replace')}
+            if status.get("status") != "Success":
+                self._write_stdout(f"\r\n{status.get('message', status)}\r\n", sys.stderr)
+
+    def _handle_json_message(self, message):
+        """处理 JSON 消息协议的消息"""
+        try:
+            msg = json.loads(message)
+        except ValueError:
+            # 如果不是JSON格式，作为stdout处理
+            self._write_stdout(message)
+            return
+        if isinstance(msg, dict) and msg.get("operation") == "stdout":
+            data = msg.get("data", "")
+            if isinstance(data, str):
+                self._write_stdout(data)
+        else:
+            self._write_stdout(f"\r\n未知操作: {msg}\r\n", sys.stderr)
+
+    async def _keepalive(self):
+        """定期 ping, 超时且期间既没有收到消息、也没有因输出积压暂停接收时断开连接"""
         while True:
-            if select.select([sys.stdin], [], [], 0)[0]:
-                ch = sys.stdin.read(1)
-                if ch:
-                    # 处理特殊控制字符
-                    if ord(ch) == 3:  # Ctrl+C
-                        print("\n正在断开连接...")
+            await asyncio.sleep(PING_INTERVAL)
+            pong = await self.websocket.ping()
+            while True:
+                received = self._received
+                try:
+                    await asyncio.wait_for(asyncio.shield(pong), PING_TIMEOUT)
+                    break
+                except asyncio.TimeoutError:
+                    if self._received == received and not any(
+                            writer.backlogged for writer in self._writers.values()):
+                        await self.websocket.close(1011, "keepalive ping timeout")
                         return
-                    elif ord(ch) == 4:  # Ctrl+D
-                        if not buffer:  # 只在缓冲区为空时退出
-                            print("\n正在断开连接...")
-                            return
-                    elif ch == '\r' or ch == '\n':  # Enter键
-                        if last_ch != '\r' and last_ch != '\n':  # 避免重复处理CR/LF
-                            cmd = buffer.strip()
-                            if cmd == 'exit':
-                                print("\n正在断开连接...")
-                                return
-                            if cmd:  # 只发送非空命令
-                                print()  # 换行
-                                yield {"operation": "stdin", "data": cmd + "\n"}
-                            buffer = ""
-                    else:
-                        if ord(ch) >= 32:  # 只显示可打印字符
-                            buffer += ch
-                            sys.stdout.write(ch)
-                            sys.stdout.flush()
-                    last_ch = ch
 
     async def _handle_websocket_messages(self):
         """处理WebSocket消息"""
         try:
+            handle = self._handle_channel_message if self.channel else self._handle_json_message
             async for message in self.websocket:
-                try:
-                    msg = json.loads(message)
-                    if msg.get("operation") == "stdout":
-                        data = msg.get("data", "")
-                        if isinstance(data, str):
-                            sys.stdout.write(data)
-                            sys.stdout.flush()
-                    else:
-                        print(f"\r\n未知操作: {msg}", file=sys.stderr)
-                except json.JSONDecodeError:
-                    # 如果不是JSON格式，作为stdout处理
-                    await self._send_message("stdout", message if isinstance(message, str) else message.decode())
+                self._received += 1
+                handle(message)
+                await self._output_ready()
         except websockets.exceptions.ConnectionClosed:
-            if self.is_connected:
-                print("\n连接已关闭")
+            if self.is_connected and self.interactive:
+                self._write_stdout("\r\n连接已关闭\r\n")
             self.is_connected = False
-            return
+        finally:
+            self._finish()
 
-    async def _handle_terminal_resize(self):
-        """处理终端大小变化"""
-        while self.is_connected:
-            new_size = shutil.get_terminal_size()
-            if (new_size.columns != self.terminal_size.columns or 
-                new_size.lines != self.terminal_size.lines):
-                self.terminal_size = new_size
-                await self._send_message(
-                    "resize",
-                    cols=self.terminal_size.columns,
-                    rows=self.terminal_size.lines
-                )
-            await asyncio.sleep(1)
+    async def _open_websocket(self):
+        """建立连接并协商消息协议"""
+        with PROFILER.phase('handshake') if PROFILER.enabled else nullcontext():
+            self.websocket = await websockets.connect(
+                self.url,
+                ping_interval=None if self.interactive else PING_INTERVAL,
+                ping_timeout=PING_TIMEOUT,
+                subprotocols=[CHANNEL_PROTOCOL] if self.protocol != 'json' else None,
+                compression='deflate' if self.compression else None
+            )
+        self.channel = self.websocket.subprotocol == CHANNEL_PROTOCOL
+        if self.protocol == 'channel' and not self.channel:
+            await self.websocket.close()
+            raise ConnectionError("服务器不支持二进制通道协议")
+        self.is_connected = True
 
     async def connect(self):
         """连接到WebSocket服务器并开始交互会话"""
         try:
-            self.websocket = await websockets.connect(
-                self.url,
-                ping_interval=30,
-                ping_timeout=10
-            )
-            self.is_connected = True
+            await self._open_websocket()
             print(f"已连接到 {self.url}")
             print("提示: 输入'exit'或按Ctrl+C退出连接\n")
             
@@ -129,39 +357,213 @@ class WebSocketShell:
             
             self._set_raw_mode()
             
+            loop = asyncio.get_running_loop()
+            self._outgoing = asyncio.Queue()
+            self._done = loop.create_future()
+            stdin_fd = sys.stdin.fileno()
+            sys.stdout.flush()
+            for stream in (sys.stdout, sys.stderr):
+                self._writers[stream] = TerminalWriter(stream.fileno(), drop=self.drop_output)
             try:
-                # 创建消息处理和终端大小监控任务
+                # 创建消息接收和发送任务, stdin 与窗口大小变化由事件循环回调
                 receive_task = asyncio.create_task(self._handle_websocket_messages())
-                resize_task = asyncio.create_task(self._handle_terminal_resize())
-                
-                # 处理用户输入
-                while self.is_connected:
-                    if select.select([sys.stdin], [], [], 0.1)[0]:
-                        ch = sys.stdin.read(1)
-                        if ch:
-                            # 处理退出命令
-                            if ch in ('\x03', '\x04'):  # Ctrl+C 或 Ctrl+D
-                                break
-                            
-                            # 发送标准输入
-                            await self._send_message("stdin", data=ch)
-                
-                # 取消后台任务
-                for task in [receive_task, resize_task]:
+                send_task = asyncio.create_task(self._send_outgoing())
+                keepalive_task = asyncio.create_task(self._keepalive())
+                loop.add_reader(stdin_fd, self._on_stdin)
+                loop.add_signal_handler(signal.SIGWINCH, self._on_resize)
+
+                await self._done
+
+                # 等待已读入的输入发送完毕, 再取消后台任务
+                self._flush_stdin()
+                if self.is_connected:
+                    pending = asyncio.ensure_future(self._outgoing.join())
+                    await asyncio.wait([pending], timeout=1)
+                    pending.cancel()
+                for task in [receive_task, send_task, keepalive_task]:
                     task.cancel()
                     try:
                         await task
                     except asyncio.CancelledError:
                         pass
-            
+
             finally:
+                loop.remove_reader(stdin_fd)
+                loop.remove_signal_handler(signal.SIGWINCH)
+                # stdout 与 stderr 可能共用同一个终端, 按相反顺序恢复文件状态
+                for writer in reversed(self._writers.values()):
+                    writer.close()
                 self._restore_terminal()
-                if self.websocket and not self.websocket.closed:
+                if self.websocket:
                     await self.websocket.close()
                     self.is_connected = False
-        
+
         except Exception as e:
             print(f"连接错误: {str(e)}")
             self._restore_terminal()
             self.is_connected = False
             return
+
+
+class ExecSession(WebSocketShell):
+    """非交互的远程 shell 会话: 连接保持打开, 逐条执行命令并返回输出和退出码
+
+    远端需要是 POSIX shell。每条命令在子 shell 中执行 (命令中的 exit、cd 不影响会话),
+    前后各输出一行带随机标记的分隔行, 结束行中带有命令的退出码; 标记在命令行里被拆成
+    两个参数, 即使远端回显输入也不会误匹配。
+    同一会话中的命令依次执行, 并发执行请使用 SessionPool。
+    """
+    interactive = False
+
+    def __init__(self, url, protocol='auto', compression=True):
+        super().__init__(url, protocol=protocol, compression=compression)
+        self._stdout = bytearray()
+        self._stderr = bytearray()
+        self._output = None
+        self._lock = asyncio.Lock()
+        self._receive_task = None
+
+    async def open(self):
+        await self._open_websocket()
+        self._done = asyncio.get_running_loop().create_future()
+        self._receive_task = asyncio.create_task(self._handle_websocket_messages())
+        # 关闭回显和提示符, 并丢弃登录信息
+        await self._send_message("stdin", data="stty -echo -onlcr 2>/dev/null; PS1=''; PS2=''\n")
+        await self.run("true")
+        return self
+
+    async def close(self):
+        self.is_connected = False
+        if self._receive_task is not None:
+            self._receive_task.cancel()
+        if self.websocket:
+            await self.websocket.close()
+
+    def _write_stdout(self, data, stream=None):
+        """收集输出而不写到终端, 读到结束标记时唤醒 run"""
+        (self._stderr if stream is sys.stderr else self._stdout).extend(
+            data if isinstance(data, bytes) else data.encode())
+        if self._output is None or self._output.done():
+            return
+        end = self._stdout.rfind(self._end)
+        if end >= 0 and self._stdout.find(b"\n", end + len(self._end)) >= 0:
+            self._output.set_result(None)
+
+    async def run(self, command, timeout=None):
+        """执行一条命令, 返回 (stdout, stderr, 退出码); 超时或连接断开时抛出异常, 会话不可再用"""
+        async with self._lock:
+            if not self.is_connected:
+                raise ConnectionError("连接已关闭")
+            token = os.urandom(8).hex()
+            begin = f"__TODO_BEGIN_{token}\n".encode()
+            self._end = f"\n__TODO_END_{token} ".encode()
+            self._stdout.clear()
+            self._stderr.clear()
+            self._output = asyncio.get_running_loop().create_future()
+            await self._send_message("stdin", data=(
+                f"printf '%s%s\\n' __TODO_ BEGIN_{token}\n"
+                f"( {command}\n) </dev/null\n"
+                f"printf '\\n%s%s %d\\n' __TODO_ END_{token} \"$?\"\n"))
+            done, _ = await asyncio.wait([self._output, self._done], timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if self._output not in done:
+                self._output.cancel()
+                await self.close()
+                if not done:
+                    raise asyncio.TimeoutError(f"命令执行超时 ({timeout}s)")
+                raise ConnectionError("连接在命令结束前关闭")
+            output = bytes(self._stdout)
+            start = output.find(begin)
+            start = 0 if start < 0 else start + len(begin)
+            end = output.rfind(self._end)
+            status = int(output[end + len(self._end):].split()[0])
+            return output[start:end], bytes(self._stderr), status
+
+
+class SessionPool:
+    """按地址保持已打开的 ExecSession, 供多条命令复用
+
+    并发的命令各占用一个空闲会话, 没有空闲会话时新建, 每个地址最多 max_sessions 个;
+    命令超时或连接断开的会话, 以及打开失败的会话直接关闭丢弃。
+    """
+
+    def __init__(self, max_sessions=8):
+        self.max_sessions = max_sessions
+        self._idle = {}
+        self._limits = {}
+
+    async def run(self, url, command, timeout=None, protocol='auto', compression=True):
+        key = (url, protocol, compression)
+        limit = self._limits.setdefault(key, asyncio.Semaphore(self.max_sessions))
+        async with limit:
+            idle = self._idle.setdefault(key, [])
+            while idle and not idle[-1].is_connected:
+                idle.pop()
+            if idle:
+                session = idle.pop()
+            else:
+                session = ExecSession(url, protocol, compression)
+                try:
+                    await asyncio.wait_for(session.open(), timeout)
+                except BaseException:
+                    # 握手超时或失败时关闭已建立的连接, 不留下半开的会话
+                    await session.close()
+                    raise
+            try:
+                result = await session.run(command, timeout)
+            except BaseException:
+                await session.close()
+                raise
+            idle.append(session)
+            return result
+
+    async def close(self):
+        for sessions in self._idle.values():
+            for session in sessions:
+                await session.close()
+        self._idle.clear()
+
+
+async def exec_once(url, command, timeout=None, protocol='auto', compression=True):
+    """新建连接执行一条命令后关闭, 返回 (stdout, stderr, 退出码)"""
+    session = ExecSession(url, protocol, compression)
+    try:
+        await asyncio.wait_for(session.open(), timeout)
+        return await session.run(command, timeout)
+    finally:
+        await session.close()
+
+
+@dataclass
+class ExecResult:
+    """一个地址上的命令执行结果; 连接失败或超时时 status 为 None, error 为原因"""
+    url: str
+    stdout: bytes = b''
+    stderr: bytes = b''
+    status: Optional[int] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+async def run_many(urls, run, parallel=16, timeout=None):
+    """在每个地址上调用 run(url), 最多 parallel 个同时进行, 按完成顺序产出 ExecResult
+
+    run 返回 (stdout, stderr, 退出码); timeout 为每个地址的超时时间。
+    """
+    limit = asyncio.Semaphore(parallel)
+
+    async def one(url):
+        async with limit:
+            start = time.perf_counter()
+            result = ExecResult(url)
+            try:
+                result.stdout, result.stderr, result.status = await asyncio.wait_for(run(url), timeout)
+            except asyncio.TimeoutError:
+                result.error = f"超时 ({timeout}s)"
+            except Exception as e:
+                result.error = str(e) or type(e).__name__
+            result.seconds = time.perf_counter() - start
+            return result
+
+    for future in asyncio.as_completed([one(url) for url in urls]):
+        yield await future